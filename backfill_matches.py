@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+backfill_matches.py
+-------------------
+Chunked, resumable historical backfill from the FootyStats API.
+
+`update_matches.py` fetches "today − 365 days" in one request.  This splits an
+arbitrary range (e.g. five seasons) into --window-days windows and:
+
+* fetches windows concurrently (thread pool) under a shared rate limit
+  (--rate requests/minute), retrying 429 / 5xx with exponential backoff
+* normalizes + encodes each window as soon as it arrives
+  (update_matches.normalize_matches → team_keys.encode_fixtures) and streams
+  it to the store as one CSV chunk per window (written to *.tmp, then renamed)
+* records every finished window in <store>/<league>_checkpoint.json, so an
+  interrupted run skips finished windows when it is started again
+* finally consolidates all chunks (dedup on game_key) into
+  <output-dir>/<league>_matches_<to>.xlsx, which train_models.py /
+  backtest.py pick up as the latest feature file
+
+Usage:
+    python backfill_matches.py --league K2 --from 2021-01-01 --to 2025-08-01 \
+        --window-days 30 --workers 4 --rate 30
+"""
+
+import argparse, datetime as dt, json, os, pathlib, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd, requests
+
+from update_matches import fetch_matches_raw, normalize_matches, warn_unknown_teams
+from update_all_matches import LEAGUE_CONFIG
+from team_keys import TeamRegistry, encode_fixtures
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces calls at least 60/rate seconds apart across all threads."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_at)
+            self.next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def windows(start: dt.date, end: dt.date, days: int) -> list[tuple[dt.date, dt.date]]:
+    """Non-overlapping inclusive [from, to] windows covering start..end."""
+    out, cur = [], start
+    while cur <= end:
+        stop = min(cur + dt.timedelta(days=days - 1), end)
+        out.append((cur, stop))
+        cur = stop + dt.timedelta(days=1)
+    return out
+
+
+def window_name(league: str, w: tuple[dt.date, dt.date]) -> str:
+    return f"{league.lower()}_{w[0]:%Y%m%d}_{w[1]:%Y%m%d}"
+
+
+class Checkpoint:
+    """Finished windows → chunk file + row count, persisted after every window."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.done = json.loads(path.read_text(encoding="utf-8"))["done"] if path.exists() else {}
+
+    def is_done(self, name: str, store: pathlib.Path) -> bool:
+        return name in self.done and (store / self.done[name]["file"]).exists()
+
+    def mark(self, name: str, file: str, rows: int):
+        self.done[name] = {"file": file, "rows": rows}
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"done": self.done}, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def fetch_window(league: str, league_id: int, w, api_key: str, limiter: RateLimiter,
+                 registry: TeamRegistry, store: pathlib.Path, retries: int) -> tuple[str, int]:
+    """Fetch one window and write its chunk; returns (chunk file name, rows)."""
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            payload = fetch_matches_raw(league_id, f"{w[0]:%Y-%m-%d}", f"{w[1]:%Y-%m-%d}", api_key)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            status = getattr(e.response, "status_code", None)
+            if attempt == retries or (status is not None and status not in RETRY_STATUS):
+                raise
+            time.sleep(2 ** attempt)
+
+    df = normalize_matches(payload)
+    if not df.empty:
+        df = encode_fixtures(df, league, registry)
+    name = window_name(league, w) + ".csv"
+    tmp = store / (name + ".tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, store / name)
+    return name, len(df)
+
+
+def consolidate(store: pathlib.Path, ckpt: Checkpoint) -> pd.DataFrame:
+    files = [store / v["file"] for v in ckpt.done.values() if v["rows"] > 0]
+    if not files:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_csv(f, parse_dates=["date"]) for f in sorted(files)], ignore_index=True)
+    dedup = df["game_key"].astype(str).where(df["game_key"] > 0, df["today_game_id"])
+    return df[~dedup.duplicated(keep="last")].sort_values("date", ignore_index=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Resumable multi-season FootyStats backfill")
+    ap.add_argument("--league", required=True, help="League code e.g. K2")
+    ap.add_argument("--league-id", type=int, default=None, help="FootyStats league_id (default: update_all_matches.LEAGUE_CONFIG)")
+    ap.add_argument("--from", dest="from_date", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--to", dest="to_date", default=dt.date.today().isoformat(), help="YYYY-MM-DD (default today)")
+    ap.add_argument("--window-days", type=int, default=30)
+    ap.add_argument("--workers", type=int, default=4, help="concurrent requests")
+    ap.add_argument("--rate", type=float, default=30, help="max requests per minute (0 = unlimited)")
+    ap.add_argument("--retries", type=int, default=4)
+    ap.add_argument("--store-dir", default="/mnt/data/backfill", help="chunk CSVs + checkpoint")
+    ap.add_argument("--output-dir", default="/mnt/data", help="where the consolidated xlsx goes")
+    ap.add_argument("--no-consolidate", action="store_true", help="only fill the chunk store")
+    ap.add_argument("--api-key", default=os.getenv("FOOTYSTATS_KEY", ""), help="FootyStats API Key")
+    args = ap.parse_args()
+
+    if not args.api_key:
+        sys.exit("ERROR: Provide FootyStats API key via --api-key or FOOTYSTATS_KEY env")
+    league_id = args.league_id if args.league_id is not None else LEAGUE_CONFIG.get(args.league.upper())
+    if league_id is None:
+        sys.exit(f"ERROR: no league_id for {args.league}; pass --league-id")
+
+    start, end = dt.date.fromisoformat(args.from_date), dt.date.fromisoformat(args.to_date)
+    store = pathlib.Path(args.store_dir)
+    store.mkdir(parents=True, exist_ok=True)
+    ckpt = Checkpoint(store / f"{args.league.lower()}_checkpoint.json")
+    todo = [w for w in windows(start, end, args.window_days) if not ckpt.is_done(window_name(args.league, w), store)]
+    n_all = len(windows(start, end, args.window_days))
+    print(f"[backfill] {args.league}: {n_all - len(todo)}/{n_all} windows already done, {len(todo)} to fetch")
+
+    registry = TeamRegistry.load()
+    limiter = RateLimiter(args.rate)
+    t0, failed = time.perf_counter(), []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futs = {pool.submit(fetch_window, args.league, league_id, w, args.api_key, limiter,
+                            registry, store, args.retries): w for w in todo}
+        for f in as_completed(futs):
+            w = futs[f]
+            try:
+                file, rows = f.result()
+            except Exception as e:
+                failed.append(w)
+                print(f"⚠️  {w[0]}~{w[1]} 실패: {e}", file=sys.stderr)
+                continue
+            ckpt.mark(window_name(args.league, w), file, rows)
+            print(f"  {w[0]}~{w[1]}: {rows} matches")
+    print(f"[backfill] fetched {len(todo) - len(failed)} windows in {time.perf_counter() - t0:.1f}s")
+    if failed:
+        sys.exit(f"ERROR: {len(failed)} window(s) failed — re-run the same command to resume")
+    if args.no_consolidate:
+        return
+
+    df = consolidate(store, ckpt)
+    if df.empty:
+        sys.exit("No matches returned from API; check league_id/date range")
+    warn_unknown_teams(df)
+    out_path = pathlib.Path(args.output_dir) / f"{args.league.lower()}_matches_{end:%Y%m%d}.xlsx"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_excel(out_path, index=False)
+    print(f"✅ Saved {len(df)} matches → {out_path}")
+
+
+if __name__ == "__main__":
+    main()
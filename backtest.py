@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+backtest.py
+-----------
+Walk-forward backtest of the per-league LightGBM models over past seasons.
+
+For every matchday of every (league, season) slice:
+  1. Fit the model on matches strictly before that date (same features and
+     params as `train_models.py --date`), or warm-start the previous
+     matchday's model with --warm-start
+  2. Predict the day's fixtures and apply the scan_upsets() flags
+  3. Score against results: log-loss, hit rate, flat-stake ROI vs stored odds
+
+Slices run in a process pool.  Fitted per-date models are cached under
+--cache-dir, keyed by league, cutoff and a fingerprint of the training rows,
+so a re-run (or an overlapping experiment) loads them instead of refitting.
+
+Odds: decimal columns odds_H/odds_D/odds_A when present, otherwise
+1 / P_*_market (merged from --odds-file on game_key; its today_game_id in any
+format is resolved with team_keys.encode_game_ids against the feature file),
+otherwise the FootyStats pre-match prices stored with the features
+(feat_odds_ft_1/x/2) — so a run without --odds-file still reports ROI.
+
+Usage:
+    python backtest.py --leagues J2 K1 K2 --seasons 2023 2024 2025 \
+        --output /mnt/data/backtest_report.xlsx --workers 8
+"""
+
+import argparse, hashlib, os, pathlib, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np, pandas as pd
+
+from train_models import latest_feature_file, prepare_data, train_lgbm, LGBM_PARAMS
+from soccer_agent_pipeline import flag_upsets
+from staking import decimal_odds
+from team_keys import encode_fixtures, encode_game_ids
+
+PROB_COLS = ["P_H", "P_D", "P_A"]
+ID_COLS = ["today_game_id", "home_team", "away_team"]
+
+
+def fingerprint(X: pd.DataFrame, y: pd.Series, *extra) -> str:
+    h = hashlib.sha1(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    h.update(y.to_numpy(dtype=np.int64).tobytes())
+    h.update(repr((list(X.columns), LGBM_PARAMS, extra)).encode())
+    return h.hexdigest()[:16]
+
+
+def fit_cached(X, y, cache_dir: pathlib.Path | None, tag: str, init_model=None, **overrides):
+    """train_lgbm() with an on-disk cache keyed by the training rows and the parent model."""
+    import joblib
+
+    parent = getattr(init_model, "_bt_key", "")
+    key = f"{tag}_{fingerprint(X, y, parent, sorted(overrides.items()))}"
+    path = cache_dir / f"{key}.pkl" if cache_dir else None
+    if path is not None and path.exists():
+        model = joblib.load(path)
+    else:
+        booster = init_model.booster_ if init_model is not None else None
+        model = train_lgbm(X, y, init_model=booster, **overrides)
+        if path is not None:
+            joblib.dump(model, path)
+    model._bt_key = key
+    return model
+
+
+def run_slice(league: str, season: int, hist: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    """Replay one season of one league; returns per-game predictions + flags."""
+    cache_dir = pathlib.Path(cfg["cache_dir"]) if cfg["cache_dir"] else None
+    day = hist["date"].dt.normalize()
+    matchdays = np.sort(day[hist["date"].dt.year == season].unique())
+    _, _, feat_cols = prepare_data(hist)
+    fit_kw = dict(n_jobs=cfg["threads"], verbose=-1)
+
+    model, out = None, []
+    for i, d in enumerate(matchdays):
+        train = hist[hist["date"] < d]
+        test = hist[day == d]
+        if len(train) < cfg["min_train"] or train["result"].nunique() < 3:
+            continue
+        X, y, _ = prepare_data(train)
+        tag = f"{league.lower()}_{pd.Timestamp(d):%Y%m%d}"
+        if cfg["warm_start"] and model is not None and i % cfg["refit_every"]:
+            model = fit_cached(X, y, cache_dir, tag, init_model=model,
+                               n_estimators=cfg["warm_rounds"], **fit_kw)
+        else:
+            model = fit_cached(X, y, cache_dir, tag, **fit_kw)
+
+        res = test[[c for c in ID_COLS if c in test.columns] + ["date", "result"]].copy()
+        res[PROB_COLS] = model.predict_proba(test[feat_cols].fillna(0))
+        if "motivation_score" in test.columns:
+            res["motivation_score"] = test["motivation_score"]
+        res[["odds_H", "odds_D", "odds_A"]] = decimal_odds(test)
+        out.append(flag_upsets(res))
+
+    if not out:
+        return pd.DataFrame()
+    df = pd.concat(out, ignore_index=True)
+    df.insert(0, "season", season)
+    df.insert(0, "league", league)
+    return df
+
+
+def summarize(preds: pd.DataFrame, min_edge: float = 0.0) -> dict:
+    """log-loss, hit rate and flat 1-unit ROI on every outcome with EV > min_edge."""
+    P = preds[PROB_COLS].to_numpy(dtype=float)
+    y = preds["result"].to_numpy(dtype=int)
+    n = len(preds)
+    onehot = np.zeros_like(P, dtype=bool)
+    onehot[np.arange(n), y] = True
+
+    odds = preds[["odds_H", "odds_D", "odds_A"]].to_numpy(dtype=float)
+    bets = np.isfinite(odds) & (P * np.nan_to_num(odds) - 1 > min_edge)
+    staked = bets.sum()
+    returned = np.where(bets & onehot, odds, 0.0).sum()
+    cover = preds["cover_flag"].to_numpy(dtype=bool)
+    return {
+        "games": n,
+        "log_loss": float(-np.log(np.clip(P[onehot], 1e-15, 1.0)).mean()),
+        "hit_rate": float((P.argmax(axis=1) == y).mean()),
+        "bets": int(staked),
+        "roi": float((returned - staked) / staked) if staked else np.nan,
+        "upset_games": int(preds["is_upset"].sum()),
+        "cover_hit_rate": float((P[cover].argmax(axis=1) == y[cover]).mean()) if cover.any() else np.nan,
+    }
+
+
+def load_league(league: str, data_dir: str, odds_file: str) -> pd.DataFrame:
+    df = pd.read_excel(latest_feature_file(league, data_dir))
+    if "result" not in df.columns:
+        raise ValueError(f"{league} feature file must contain 'result' column")
+    df["date"] = pd.to_datetime(df["date"])
+    if odds_file:
+        if "game_key" not in df.columns:
+            df = encode_fixtures(df, league)
+        odds = pd.read_csv(odds_file)
+        if "game_key" not in odds.columns:
+            odds["game_key"] = encode_game_ids(odds["today_game_id"], df, league)
+        odds = odds[odds["game_key"] > 0].drop(columns=["today_game_id"], errors="ignore")
+        df = df.merge(odds.drop_duplicates("game_key", keep="last"), on="game_key", how="left",
+                      suffixes=("", "_odds"), validate="many_to_one")
+    return df.dropna(subset=["result"]).sort_values("date", ignore_index=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Walk-forward backtest over historical seasons")
+    ap.add_argument("--leagues", nargs="+", required=True, help="e.g. J2 K1 K2")
+    ap.add_argument("--seasons", nargs="+", type=int, required=True, help="e.g. 2023 2024 2025")
+    ap.add_argument("--data-dir", default="/mnt/data", help="where <league>_matches_*.xlsx live")
+    ap.add_argument("--odds-file", default="", help="market odds CSV (today_game_id or game_key, P_*_market)")
+    ap.add_argument("--output", default="/mnt/data/backtest_report.xlsx")
+    ap.add_argument("--cache-dir", default="/mnt/data/backtest_cache", help="'' disables the model cache")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="process pool size")
+    ap.add_argument("--min-train", type=int, default=100, help="skip matchdays with fewer prior matches")
+    ap.add_argument("--warm-start", action="store_true", help="continue the previous matchday's model")
+    ap.add_argument("--warm-rounds", type=int, default=30, help="extra trees per warm-started matchday")
+    ap.add_argument("--refit-every", type=int, default=10, help="full refit every N matchdays when warm-starting")
+    ap.add_argument("--min-edge", type=float, default=0.0, help="EV threshold for ROI bets")
+    args = ap.parse_args()
+
+    if args.cache_dir:
+        pathlib.Path(args.cache_dir).mkdir(parents=True, exist_ok=True)
+    workers = max(1, args.workers or 1)
+    cfg = dict(cache_dir=args.cache_dir, min_train=args.min_train, warm_start=args.warm_start,
+               warm_rounds=args.warm_rounds, refit_every=max(1, args.refit_every),
+               threads=max(1, (os.cpu_count() or 1) // workers))
+
+    t0 = time.perf_counter()
+    jobs = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for lg in args.leagues:
+            df = load_league(lg, args.data_dir, args.odds_file)
+            for season in args.seasons:
+                # only history up to the end of the season travels to the worker
+                hist = df[df["date"].dt.year <= season]
+                jobs.append(pool.submit(run_slice, lg, season, hist, cfg))
+        parts = [f.result() for f in as_completed(jobs)]
+
+    preds = pd.concat([p for p in parts if not p.empty], ignore_index=True)
+    if preds.empty:
+        raise SystemExit("No matchdays had enough history to backtest")
+    preds = preds.sort_values(["league", "date"], ignore_index=True)
+
+    rows = [{"league": lg, "season": s, **summarize(g, args.min_edge)}
+            for (lg, s), g in preds.groupby(["league", "season"])]
+    rows.append({"league": "ALL", "season": "ALL", **summarize(preds, args.min_edge)})
+    summary = pd.DataFrame(rows)
+
+    out_path = pathlib.Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(out_path) as xl:
+        summary.to_excel(xl, sheet_name="summary", index=False)
+        preds.to_excel(xl, sheet_name="predictions", index=False)
+    print(summary.to_string(index=False))
+    print(f"✅ Backtest ({len(jobs)} slices, {time.perf_counter() - t0:.1f}s) → {out_path}")
+
+
+if __name__ == "__main__":
+    main()
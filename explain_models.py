@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+explain_models.py
+-----------------
+Per-league feature importance from the trained models themselves, replacing the
+hand-edited <league>_feature_weights_YYYYMMDD.xlsx workbooks.
+
+* Contributions come from LightGBM's pred_contrib (exact TreeSHAP per row,
+  per class) computed in one batch for all rows that are not cached yet
+* Cache: <cache-dir>/<league>_<model version>.pkl, model version = hash of
+  the booster text, rows keyed by (today_game_id, hash of the feature row) —
+  a retrain starts a new file, an edited qual row is recomputed, everything
+  else (e.g. explaining a matchday again) is a lookup
+* Aggregation: mean |contribution| over rows and classes per feature, mapped
+  to the workbook's Category_Type / Subcategory groups (FEATURE_GROUPS) and
+  normalized to Weight summing to 1
+* Output: <league>_feature_weights_<date>.xlsx — Sheet1 in the workbook
+  layout (Category_Type, Subcategory, Weight, Update_Date, League), plus
+  'features' (per feature) and 'games' (top drivers of each matchday pick)
+
+* Model: --pooled / --per-league, default whichever of lgbm_pooled.pkl and
+  <league>_lgbm.pkl is newer (train_models.py --explain passes its own mode)
+
+Usage:
+    python explain_models.py --date 2025-08-02 --leagues J2 K1 K2 [--pooled]
+"""
+
+import argparse, datetime as dt, hashlib, pathlib, re, time
+
+import numpy as np, pandas as pd
+
+from train_models import latest_feature_file, pooled_matrix
+
+OUTCOMES = ["H", "D", "A"]
+
+# first match wins; feature names are matched case-insensitively
+FEATURE_GROUPS = [
+    (r"motivation", "Qualitative", "Motivation"),
+    (r"derby|rival", "Qualitative", "Derby/Rivalry"),
+    (r"injury|lineup|manager|tactic|player|suspen", "Qualitative", "Manager/Player Issues"),
+    (r"media|psych|qual_total", "Qualitative", "Media/Psychology"),
+    (r"market|odds", "Quantitative", "Market Info"),
+    (r"h2h|head_to_head", "Quantitative", "H2H"),
+    (r"rest|travel", "Quantitative", "Rest & Travel"),
+    (r"xg|shot|attack|defen", "Quantitative", "Attack/Defense xG"),
+    (r"form|last_?\d|streak|recent", "Quantitative", "Recent Form"),
+    (r"ppg|point|position|rank|season|table|goal|win|draw|loss", "Quantitative", "Team Season Metrics"),
+]
+DEFAULT_GROUP = ("Quantitative", "Derived & Environment")
+
+# row order of the original workbooks
+WORKBOOK_ROWS = [
+    ("Quantitative", "Team Season Metrics"), ("Quantitative", "Recent Form"),
+    ("Quantitative", "Attack/Defense xG"), ("Quantitative", "Rest & Travel"),
+    ("Quantitative", "Market Info"), ("Quantitative", "H2H"), ("Quantitative", "Derived & Environment"),
+    ("Qualitative", "Motivation"), ("Qualitative", "Derby/Rivalry"),
+    ("Qualitative", "Manager/Player Issues"), ("Qualitative", "Media/Psychology"),
+]
+
+
+def feature_group(name: str) -> tuple[str, str]:
+    for pattern, cat, sub in FEATURE_GROUPS:
+        if re.search(pattern, name, re.IGNORECASE):
+            return cat, sub
+    return DEFAULT_GROUP
+
+
+def model_version(model) -> str:
+    booster = getattr(model, "booster_", model)
+    return hashlib.sha1(booster.model_to_string().encode()).hexdigest()[:12]
+
+
+def load_league_model(league: str, model_dir: str, pooled: bool | None = None) -> tuple[object, list[str], list[str] | None]:
+    """(LGBMClassifier, feature columns, pooled league categories or None).
+
+    pooled=True / False picks lgbm_pooled.pkl / <league>_lgbm.pkl; None takes
+    whichever of the two was written last, so a leftover pickle from an
+    earlier run of the other mode is never explained instead of the new model.
+    """
+    import joblib
+    per_league = pathlib.Path(model_dir) / f"{league.lower()}_lgbm.pkl"
+    pooled_path = pathlib.Path(model_dir) / "lgbm_pooled.pkl"
+    if pooled is None:
+        have = [p for p in (per_league, pooled_path) if p.exists()]
+        pooled = bool(have) and max(have, key=lambda p: p.stat().st_mtime) == pooled_path
+    path = pooled_path if pooled else per_league
+    if not path.exists():
+        raise FileNotFoundError(f"No LightGBM model for {league} in {model_dir} ({path.name})")
+    obj = joblib.load(path)
+    if not pooled:
+        return obj["model"], obj["features"], None
+    return obj["fine_tuned"].get(league, obj["model"]), obj["features"], obj["leagues"]
+
+
+class ContribCache:
+    """pred_contrib rows for one model version, keyed by (today_game_id, feature-row hash)."""
+
+    def __init__(self, cache_dir, league: str, model, features: list[str]):
+        self.model, self.features = model, features
+        self.version = model_version(model)
+        self.path = pathlib.Path(cache_dir) / f"{league.lower()}_{self.version}.pkl" if cache_dir else None
+        self.table = pd.read_pickle(self.path) if self.path is not None and self.path.exists() else None
+        self.columns = [f"{o}:{f}" for o in OUTCOMES for f in [*features, "bias"]]
+
+    def lookup(self, ids: pd.Series, X: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+        """Contributions for every row of X (same order); returns (frame, rows computed)."""
+        row_hash = pd.util.hash_pandas_object(X, index=False).to_numpy()
+        keys = pd.MultiIndex.from_arrays([ids.astype(str).to_numpy(), row_hash], names=["today_game_id", "row_hash"])
+        have = self.table.index if self.table is not None else pd.MultiIndex.from_arrays([[], []])
+        miss = ~keys.isin(have)
+        if miss.any():
+            new_keys = keys[miss]
+            first = ~new_keys.duplicated()
+            contrib = self.model.predict(X[miss][first], pred_contrib=True)
+            new = pd.DataFrame(np.asarray(contrib, dtype=np.float64), index=new_keys[first], columns=self.columns)
+            self.table = new if self.table is None else pd.concat([self.table, new])
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.table.to_pickle(self.path)
+        return self.table.reindex(keys), int(miss.sum())
+
+
+def importance_table(contrib: pd.DataFrame, features: list[str]) -> pd.DataFrame:
+    """Mean |contribution| per feature (summed over classes), normalized to 1."""
+    mean_abs = contrib.abs().mean()
+    w = pd.Series({f: sum(mean_abs[f"{o}:{f}"] for o in OUTCOMES) for f in features})
+    w = w / w.sum() if w.sum() > 0 else w
+    groups = [feature_group(f) for f in features]
+    return pd.DataFrame({"Feature": features, "Category_Type": [g[0] for g in groups],
+                         "Subcategory": [g[1] for g in groups], "Weight": w.to_numpy()})
+
+
+def weights_workbook(features: pd.DataFrame, league: str, date: str) -> pd.DataFrame:
+    """Per-feature weights → the Category_Type / Subcategory rows of the old workbooks (all rows, 0 if unused)."""
+    w = features.groupby(["Category_Type", "Subcategory"])["Weight"].sum()
+    out = pd.DataFrame(WORKBOOK_ROWS, columns=["Category_Type", "Subcategory"])
+    out["Weight"] = w.reindex(pd.MultiIndex.from_tuples(WORKBOOK_ROWS)).fillna(0).round(4).to_numpy()
+    out["Update_Date"], out["League"] = date, league
+    return out
+
+
+def game_drivers(contrib: pd.DataFrame, P: np.ndarray, features: list[str], top: int = 3) -> pd.DataFrame:
+    """Top features pushing each game towards its predicted outcome."""
+    pick = P.argmax(axis=1)
+    rows = []
+    for i, (gid, _) in enumerate(contrib.index):
+        o = OUTCOMES[pick[i]]
+        c = contrib.iloc[i][[f"{o}:{f}" for f in features]].to_numpy()
+        best = np.argsort(-c)[:top]
+        rows.append({"today_game_id": gid, "pick": o, "P_pick": round(float(P[i, pick[i]]), 4),
+                     **{f"driver_{j + 1}": f"{features[k]} ({c[k]:+.3f})" for j, k in enumerate(best)}})
+    return pd.DataFrame(rows)
+
+
+def explain_league(league: str, date: str, model_dir: str, data_dir: str, cache_dir: str, output_dir: str,
+                   pooled: bool | None = None):
+    model, features, leagues = load_league_model(league, model_dir, pooled)
+    df = pd.read_excel(latest_feature_file(league, data_dir))
+    if leagues is not None:
+        X = pooled_matrix(df.assign(league=league), features, leagues)
+    else:
+        X = df.reindex(columns=features).fillna(0)
+
+    cache = ContribCache(cache_dir, league, model, features)
+    t0 = time.perf_counter()
+    contrib, computed = cache.lookup(df["today_game_id"], X)
+    elapsed = time.perf_counter() - t0
+
+    feats = importance_table(contrib, features)
+    day = df["today_game_id"].astype(str).str.startswith(date.replace("-", "")).to_numpy()
+    games = (game_drivers(contrib[day], model.predict_proba(X[day]), features)
+             if day.any() else pd.DataFrame())
+
+    out_path = pathlib.Path(output_dir) / f"{league.lower()}_feature_weights_{date.replace('-', '')}.xlsx"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(out_path) as xl:
+        weights_workbook(feats, league, date).to_excel(xl, sheet_name="Sheet1", index=False)
+        feats.sort_values("Weight", ascending=False).to_excel(xl, sheet_name="features", index=False)
+        if not games.empty:
+            games.to_excel(xl, sheet_name="games", index=False)
+    print(f"[{league}] model {cache.version}: {len(X)} rows, {computed} computed, "
+          f"{len(X) - computed} from cache ({1e3 * elapsed:.0f} ms)")
+    print(f"✅ Weights saved → {out_path}")
+    return out_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="pred_contrib feature importance per league (cached per model version)")
+    ap.add_argument("--date", default=dt.date.today().isoformat(), help="YYYY-MM-DD: Update_Date + matchday for 'games'")
+    ap.add_argument("--leagues", nargs="+", required=True)
+    ap.add_argument("--model-dir", default="/mnt/data/models")
+    ap.add_argument("--data-dir", default="/mnt/data", help="where <league>_matches_*.xlsx live")
+    ap.add_argument("--cache-dir", default="/mnt/data/explain_cache", help="'' disables the cache")
+    ap.add_argument("--output-dir", default="/mnt/data")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--pooled", dest="pooled", action="store_const", const=True,
+                      help="explain lgbm_pooled.pkl (fine-tuned booster per league if present)")
+    mode.add_argument("--per-league", dest="pooled", action="store_const", const=False,
+                      help="explain <league>_lgbm.pkl (default: whichever pickle is newer)")
+    args = ap.parse_args()
+
+    for lg in args.leagues:
+        explain_league(lg, args.date, args.model_dir, args.data_dir, args.cache_dir, args.output_dir, args.pooled)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+inplay.py
+---------
+In-play P_H/P_D/P_A updates from a live event stream (goals, red cards,
+minute ticks) for every game of the matchday at once.
+
+* At start-up each game's pre-match goal rates (λ, μ) are taken from the
+  report (exp_home_goals / exp_away_goals from `train_models.py --engine
+  poisson`) or fitted to its P_H/P_D/P_A on a rate grid
+* For every game × red-card state (home reds − away reds, −2..2) × minute
+  (0..90) the distribution of the remaining goal difference is precomputed
+  from time-scaled Poisson rates — nothing is refitted during the match
+* An event is then an O(1) lookup: current score + minute + red state →
+  P_H/P_D/P_A, and the upset / cover flags (flag_upsets rule) are
+  re-evaluated across all live games
+
+Events are line-delimited JSON, from a file (replay), stdin, or tcp://host:port:
+    {"game_id": "20250802-GYE-BUS", "type": "goal", "team": "home", "minute": 23}
+    {"game_id": "20250802-GYE-BUS", "type": "red", "team": "away", "minute": 51}
+    {"game_id": "*", "type": "tick", "minute": 60}
+Optional "ts" (seconds) paces a replay with --speed.
+
+Usage:
+    python inplay.py --report /mnt/data/report_20250802.xlsx --source events.jsonl --output live.jsonl
+"""
+
+import argparse, contextlib, json, pathlib, socket, sys, time
+
+import numpy as np, pandas as pd
+from scipy.stats import poisson
+
+MAX_GOALS = 10          # remaining goals per side covered by the tables
+FULL_TIME = 90
+RED_STATES = 2          # red-card differential clipped to ±2
+RED_OWN, RED_OPP = 0.67, 1.25  # rate multipliers for the side a man down / its opponent
+
+
+def diff_distribution(lam: np.ndarray, mu: np.ndarray, max_goals: int = MAX_GOALS) -> np.ndarray:
+    """P(X − Y = z), z = −G..G, for X ~ Poisson(lam), Y ~ Poisson(mu); broadcasts over leading dims."""
+    k = np.arange(max_goals + 1)
+    px = poisson.pmf(k, np.asarray(lam)[..., None])
+    py = poisson.pmf(k, np.asarray(mu)[..., None])
+    D = np.zeros(px.shape[:-1] + (2 * max_goals + 1,))
+    for i in k:
+        D[..., i - k + max_goals] += px[..., i:i + 1] * py
+    return D
+
+
+def rates_from_probs(P: np.ndarray, step: float = 0.025, top: float = 4.0) -> tuple[np.ndarray, np.ndarray]:
+    """Nearest (λ, μ) on a grid whose independent-Poisson H/D/A matches P."""
+    grid = np.arange(step, top + step, step)
+    lam, mu = np.meshgrid(grid, grid, indexing="ij")
+    lam, mu = lam.ravel(), mu.ravel()
+    C = np.cumsum(diff_distribution(lam, mu), axis=-1)
+    G = MAX_GOALS
+    away, draw = C[:, G - 1], C[:, G] - C[:, G - 1]
+    grid_P = np.stack([1 - away - draw, draw, away], axis=1)
+    best = ((P[:, None, :] - grid_P[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    return lam[best], mu[best]
+
+
+class LiveBook:
+    """Vectorized live state + precomputed tables for all games of the day."""
+
+    def __init__(self, games: pd.DataFrame, n_cover: int = 4):
+        self.games = games.reset_index(drop=True)
+        self.ids = self.games["today_game_id"].astype(str).to_numpy()
+        self.index = {gid: i for i, gid in enumerate(self.ids)}
+        self.n_cover = n_cover
+        n = len(self.games)
+
+        if {"exp_home_goals", "exp_away_goals"} <= set(self.games.columns):
+            lam = self.games["exp_home_goals"].to_numpy(dtype=float)
+            mu = self.games["exp_away_goals"].to_numpy(dtype=float)
+        else:
+            lam, mu = rates_from_probs(self.games[["P_H", "P_D", "P_A"]].to_numpy(dtype=float))
+
+        # cum[g, s, m, z] = P(remaining home − away goals <= z − G), s = red diff + 2
+        s = np.arange(-RED_STATES, RED_STATES + 1)
+        home_mult = RED_OWN ** np.clip(s, 0, None) * RED_OPP ** np.clip(-s, 0, None)
+        away_mult = RED_OPP ** np.clip(s, 0, None) * RED_OWN ** np.clip(-s, 0, None)
+        remaining = (FULL_TIME - np.arange(FULL_TIME + 1)) / FULL_TIME
+        lam_t = lam[:, None, None] * home_mult[None, :, None] * remaining[None, None, :]
+        mu_t = mu[:, None, None] * away_mult[None, :, None] * remaining[None, None, :]
+        self.cum = np.cumsum(diff_distribution(lam_t, mu_t), axis=-1)
+
+        self.home_goals = np.zeros(n, dtype=np.int64)
+        self.away_goals = np.zeros(n, dtype=np.int64)
+        self.red_home = np.zeros(n, dtype=np.int64)
+        self.red_away = np.zeros(n, dtype=np.int64)
+        self.minute = np.zeros(n, dtype=np.int64)
+        self.finished = np.zeros(n, dtype=bool)
+        col = next((c for c in ("diff_motivation_score", "motivation_score") if c in self.games.columns), None)
+        self.motivation = (pd.to_numeric(self.games[col], errors="coerce").fillna(0).to_numpy()
+                           if col else np.zeros(n))
+        self.probs = np.zeros((n, 3))
+        self.refresh(np.arange(n))
+
+    def refresh(self, idx: np.ndarray):
+        """Recompute P_H/P_D/P_A for games `idx` from the tables (no fitting)."""
+        G = MAX_GOALS
+        lead = self.home_goals[idx] - self.away_goals[idx]
+        s = np.clip(self.red_home[idx] - self.red_away[idx], -RED_STATES, RED_STATES) + RED_STATES
+        row = self.cum[idx, s, np.clip(self.minute[idx], 0, FULL_TIME)]  # (k, 2G+1)
+
+        def cdf(z):  # P(Z <= z) with the table's support clipped
+            j = z + G
+            inside = row[np.arange(len(idx)), np.clip(j, 0, 2 * G)]
+            return np.where(j < 0, 0.0, np.where(j > 2 * G, 1.0, inside))
+
+        p_away = cdf(-lead - 1)
+        p_draw = cdf(-lead) - p_away
+        P = np.stack([1 - p_away - p_draw, p_draw, p_away], axis=1)
+        done = self.finished[idx]
+        if done.any():  # final whistle: the result is known
+            P[done] = np.eye(3)[np.where(lead[done] > 0, 0, np.where(lead[done] == 0, 1, 2))]
+        self.probs[idx] = P
+
+    def flags(self) -> tuple[np.ndarray, np.ndarray]:
+        """is_upset / cover_flag over all live games (same rule as flag_upsets)."""
+        is_upset = (np.abs(self.motivation) >= 1.5) | (self.probs.max(axis=1) < 0.37)
+        entropy = -np.sum(self.probs * np.log(self.probs + 1e-12), axis=1)
+        cover = np.zeros(len(entropy), dtype=bool)
+        cover[np.argsort(-entropy, kind="stable")[:self.n_cover]] = True
+        return is_upset, cover
+
+    def apply(self, ev: dict) -> np.ndarray:
+        """Apply one event; returns the indices of the games it touched."""
+        gid = str(ev.get("game_id", "*"))
+        idx = np.arange(len(self.ids)) if gid == "*" else np.array([self.index[gid]]) if gid in self.index else None
+        if idx is None:
+            return np.zeros(0, dtype=np.int64)
+        kind = ev.get("type", "tick")
+        if "minute" in ev:
+            self.minute[idx] = np.maximum(self.minute[idx], int(ev["minute"]))
+        home = ev.get("team") == "home"
+        if kind == "goal":
+            (self.home_goals if home else self.away_goals)[idx] += 1
+        elif kind == "red":
+            (self.red_home if home else self.red_away)[idx] += 1
+        elif kind == "end":
+            self.finished[idx] = True
+        self.refresh(idx)
+        return idx
+
+
+def read_events(source: str):
+    """Yield event dicts from a JSONL file, '-' (stdin) or tcp://host:port."""
+    if source.startswith("tcp://"):
+        host, port = source[len("tcp://"):].rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+        stream = sock.makefile("r", encoding="utf-8")
+    elif source == "-":
+        stream = sys.stdin
+    else:
+        stream = open(source, encoding="utf-8")
+    with contextlib.closing(stream):
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="In-play probability updates from a live event stream")
+    ap.add_argument("--report", required=True, help="pre-match report/prediction xlsx (today_game_id, P_*)")
+    ap.add_argument("--source", required=True, help="events JSONL file, '-' for stdin, or tcp://host:port")
+    ap.add_argument("--output", default="-", help="JSONL updates ('-' = stdout)")
+    ap.add_argument("--speed", type=float, default=0.0, help="replay pacing by event 'ts' (0 = as fast as possible)")
+    ap.add_argument("--snapshot", default="", help="write final live state to this xlsx")
+    args = ap.parse_args()
+
+    book = LiveBook(pd.read_excel(args.report))
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    latencies, t_prev = [], None
+    with contextlib.closing(out) if out is not sys.stdout else contextlib.nullcontext():
+        for ev in read_events(args.source):
+            if args.speed > 0 and "ts" in ev:
+                if t_prev is not None:
+                    time.sleep(max(0.0, (ev["ts"] - t_prev) / args.speed))
+                t_prev = ev["ts"]
+            t0 = time.perf_counter()
+            idx = book.apply(ev)
+            is_upset, cover = book.flags()
+            latencies.append(time.perf_counter() - t0)
+            for i in idx:
+                out.write(json.dumps({
+                    "game_id": book.ids[i], "minute": int(book.minute[i]),
+                    "score": f"{book.home_goals[i]}-{book.away_goals[i]}",
+                    "P_H": round(float(book.probs[i, 0]), 4), "P_D": round(float(book.probs[i, 1]), 4),
+                    "P_A": round(float(book.probs[i, 2]), 4),
+                    "is_upset": bool(is_upset[i]), "cover_flag": bool(cover[i]),
+                }, ensure_ascii=False) + "\n")
+            out.flush()
+
+    if args.snapshot:
+        is_upset, cover = book.flags()
+        snap = book.games[["today_game_id"]].copy()
+        snap["minute"], snap["home_goals"], snap["away_goals"] = book.minute, book.home_goals, book.away_goals
+        snap[["P_H", "P_D", "P_A"]] = book.probs
+        snap["is_upset"], snap["cover_flag"] = is_upset, cover
+        pathlib.Path(args.snapshot).parent.mkdir(parents=True, exist_ok=True)
+        snap.to_excel(args.snapshot, index=False)
+    if latencies:
+        lat = np.array(latencies) * 1e6
+        print(f"{len(lat)} events | update latency p50 {np.median(lat):.0f} µs, "
+              f"p99 {np.percentile(lat, 99):.0f} µs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
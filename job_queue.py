@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+job_queue.py
+------------
+Broker-less job queue (one SQLite file) for spreading training, backtest
+slices and hyper-parameter trials over worker processes on one or many hosts.
+
+* enqueue   → one job per league (train), per (league, season) (backtest-slice)
+              or per random parameter draw (hparam)
+* worker    → claims the oldest runnable job under a lease, renews the lease
+              from a heartbeat thread while it runs, writes results next to the
+              models and marks it done.  A job whose lease runs out (worker
+              killed, host lost) is claimed again; a failing job is retried
+              until max_attempts, then left as 'failed' with its traceback
+* status    → counts per kind / status, or the failed jobs
+* collect   → backtest-slice results → one summary/predictions xlsx
+              (same layout as backtest.py)
+
+Scaling out = starting more workers against the same --db.  For several hosts
+put the db on a share whose filesystem honours SQLite locks.
+
+Usage:
+    python job_queue.py enqueue train --date 2025-08-02 --leagues J2 K1 K2
+    python job_queue.py enqueue backtest-slice --leagues K1 K2 --seasons 2023 2024 2025
+    python job_queue.py enqueue hparam --leagues K2 --date 2025-08-02 --trials 40
+    python job_queue.py worker --procs 4
+    python job_queue.py status
+    python job_queue.py collect --output /mnt/data/backtest_report.xlsx
+"""
+
+import argparse, json, math, multiprocessing, os, pathlib, random, socket, sqlite3, sys, threading, time, traceback
+
+DEFAULT_DB = "/mnt/data/jobs.sqlite"
+DEFAULT_RESULTS = "/mnt/data/job_results"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind         TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker       TEXT,
+    lease_until  REAL,
+    result       TEXT,
+    error        TEXT,
+    created      REAL NOT NULL,
+    updated      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, lease_until, id);
+"""
+
+
+class JobQueue:
+    def __init__(self, path: str = DEFAULT_DB):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()  # heartbeat thread shares the connection
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def enqueue(self, kind: str, payload: dict, max_attempts: int = 3) -> int:
+        now = time.time()
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO jobs (kind, payload, max_attempts, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), max_attempts, now, now))
+        return cur.lastrowid
+
+    def claim(self, worker: str, lease: float, kinds=None) -> tuple[int, str, dict] | None:
+        """Atomically take the oldest queued (or lease-expired) job."""
+        now = time.time()
+        kind_sql = f" AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # leases that ran out on their last attempt are failures, not work
+                self.conn.execute(
+                    "UPDATE jobs SET status='failed', error=COALESCE(error, 'lease expired'), updated=? "
+                    "WHERE status='running' AND lease_until < ? AND attempts >= max_attempts", (now, now))
+                row = self.conn.execute(
+                    "SELECT id, kind, payload FROM jobs WHERE (status='queued' OR "
+                    f"(status='running' AND lease_until < ?)){kind_sql} ORDER BY id LIMIT 1",
+                    (now, *(kinds or []))).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET status='running', attempts=attempts+1, worker=?, lease_until=?, updated=? "
+                        "WHERE id=?", (worker, now + lease, now, row[0]))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def heartbeat(self, job_id: int, worker: str, lease: float) -> bool:
+        """Extend the lease; False if the job was taken over by someone else."""
+        now = time.time()
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE jobs SET lease_until=?, updated=? WHERE id=? AND worker=? AND status='running'",
+                (now + lease, now, job_id, worker))
+        return cur.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result: dict):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status='done', result=?, error=NULL, lease_until=NULL, updated=? "
+                "WHERE id=? AND worker=?", (json.dumps(result, ensure_ascii=False, default=str),
+                                            time.time(), job_id, worker))
+
+    def fail(self, job_id: int, worker: str, error: str):
+        """Back to the queue while attempts remain, otherwise 'failed'."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status=CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                "error=?, lease_until=NULL, updated=? WHERE id=? AND worker=?",
+                (error, time.time(), job_id, worker))
+
+    def counts(self) -> list[tuple[str, str, int]]:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status ORDER BY kind, status").fetchall()
+
+    def jobs(self, kind: str | None = None, status: str | None = None) -> list[dict]:
+        sql, args = "SELECT id, kind, payload, status, attempts, worker, result, error FROM jobs WHERE 1=1", []
+        if kind:
+            sql, args = sql + " AND kind=?", args + [kind]
+        if status:
+            sql, args = sql + " AND status=?", args + [status]
+        with self.lock:
+            rows = self.conn.execute(sql + " ORDER BY id", args).fetchall()
+        keys = ["id", "kind", "payload", "status", "attempts", "worker", "result", "error"]
+        return [dict(zip(keys, r)) for r in rows]
+
+
+# ----------------------------------------------------------------- handlers
+# each takes (payload, results_dir) and returns a JSON-able dict
+
+def run_train(p: dict, results: pathlib.Path) -> dict:
+    from soccer_cli import run_module
+    argv = ["--date", p["date"], "--leagues", *p["leagues"], "--data-dir", p.get("data_dir", "/mnt/data"),
+            "--model-dir", p.get("model_dir", "/mnt/data/models"), "--output-dir", p.get("output_dir", "/mnt/data"),
+            "--engine", p.get("engine", "lgbm")]
+    run_module("train_models", argv + list(p.get("extra_args", [])))
+    return {"leagues": p["leagues"], "model_dir": p.get("model_dir", "/mnt/data/models")}
+
+
+def run_backtest_slice(p: dict, results: pathlib.Path) -> dict:
+    from backtest import load_league, run_slice, summarize
+    df = load_league(p["league"], p.get("data_dir", "/mnt/data"), p.get("odds_file", ""))
+    hist = df[df["date"].dt.year <= p["season"]]
+    cfg = dict(cache_dir=p.get("cache_dir", "/mnt/data/backtest_cache"), min_train=p.get("min_train", 100),
+               warm_start=p.get("warm_start", False), warm_rounds=p.get("warm_rounds", 30),
+               refit_every=max(1, p.get("refit_every", 10)), threads=p.get("threads", 1))
+    if cfg["cache_dir"]:
+        pathlib.Path(cfg["cache_dir"]).mkdir(parents=True, exist_ok=True)
+    preds = run_slice(p["league"], p["season"], hist, cfg)
+    if preds.empty:
+        return {"league": p["league"], "season": p["season"], "games": 0}
+    path = results / f"bt_{p['league'].lower()}_{p['season']}.csv"
+    preds.to_csv(path, index=False)
+    return {"league": p["league"], "season": p["season"], "predictions": str(path),
+            **summarize(preds, p.get("min_edge", 0.0))}
+
+
+def run_hparam(p: dict, results: pathlib.Path) -> dict:
+    """One parameter draw: fit on the older 80% of matches before `date`, score the newest 20%."""
+    import numpy as np, pandas as pd
+    from train_models import latest_feature_file, prepare_data, train_lgbm
+
+    df = pd.read_excel(latest_feature_file(p["league"], p.get("data_dir", "/mnt/data")))
+    df = df[df["date"] < pd.Timestamp(p["date"])].dropna(subset=["result"]).sort_values("date", kind="stable")
+    cut = int(len(df) * (1 - p.get("holdout", 0.2)))
+    X, y, cols = prepare_data(df.iloc[:cut])
+    model = train_lgbm(X, y, verbose=-1, n_jobs=p.get("threads", 1), **p["params"])
+    P = np.clip(model.predict_proba(df.iloc[cut:][cols].fillna(0)), 1e-15, 1.0)
+    y_test = df.iloc[cut:]["result"].to_numpy(dtype=int)
+    out = {"league": p["league"], "params": p["params"],
+           "log_loss": float(-np.log(P[np.arange(len(y_test)), y_test]).mean()),
+           "accuracy": float((P.argmax(axis=1) == y_test).mean())}
+    trials = pathlib.Path(p.get("model_dir", "/mnt/data/models")) / "trials"
+    trials.mkdir(parents=True, exist_ok=True)
+    (trials / f"{p['league'].lower()}_{p['trial']:04d}.json").write_text(json.dumps(out, indent=1))
+    return out
+
+
+HANDLERS = {"train": run_train, "backtest-slice": run_backtest_slice, "hparam": run_hparam}
+
+HPARAM_SPACE = {  # name → (low, high, log-scale, int)
+    "learning_rate": (0.01, 0.2, True, False),
+    "num_leaves": (7, 63, False, True),
+    "min_child_samples": (5, 60, False, True),
+    "n_estimators": (100, 600, False, True),
+    "colsample_bytree": (0.5, 1.0, False, False),
+    "reg_lambda": (1e-3, 10.0, True, False),
+}
+
+
+def sample_params(rng) -> dict:
+    out = {}
+    for name, (lo, hi, log, is_int) in HPARAM_SPACE.items():
+        v = math.exp(rng.uniform(math.log(lo), math.log(hi))) if log else rng.uniform(lo, hi)
+        out[name] = int(round(v)) if is_int else round(v, 5)
+    return out
+
+
+# ------------------------------------------------------------------- worker
+
+def worker_loop(db: str, results: str, lease: float, idle_exit: float, max_jobs: int, kinds=None):
+    q = JobQueue(db)
+    results_dir = pathlib.Path(results)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    done, idle_since = 0, time.monotonic()
+    while max_jobs <= 0 or done < max_jobs:
+        job = q.claim(name, lease, kinds)
+        if job is None:
+            if idle_exit >= 0 and time.monotonic() - idle_since > idle_exit:
+                break
+            time.sleep(1.0)
+            continue
+        job_id, kind, payload = job
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(lease / 3):
+                if not q.heartbeat(job_id, name, lease):
+                    break
+
+        hb = threading.Thread(target=beat, daemon=True)
+        hb.start()
+        t0 = time.perf_counter()
+        try:
+            result = HANDLERS[kind](payload, results_dir)
+        except BaseException as e:  # SystemExit from a script's main() is a job failure too
+            stop.set()
+            q.fail(job_id, name, "".join(traceback.format_exception(type(e), e, e.__traceback__))[-4000:])
+            print(f"[{name}] job {job_id} ({kind}) failed: {e!r}", file=sys.stderr)
+            if isinstance(e, KeyboardInterrupt):
+                raise
+        else:
+            stop.set()
+            q.complete(job_id, name, {**result, "seconds": round(time.perf_counter() - t0, 2)})
+            print(f"[{name}] job {job_id} ({kind}) done in {time.perf_counter() - t0:.1f}s")
+        hb.join()
+        done += 1
+        idle_since = time.monotonic()
+
+
+# ---------------------------------------------------------------------- cli
+
+def cmd_enqueue(args):
+    q = JobQueue(args.db)
+    common = dict(data_dir=args.data_dir, model_dir=args.model_dir)
+    ids = []
+    if args.kind == "train":
+        for lg in args.leagues:
+            ids.append(q.enqueue("train", {**common, "date": args.date, "leagues": [lg], "engine": args.engine,
+                                           "output_dir": args.output_dir}, args.max_attempts))
+    elif args.kind == "backtest-slice":
+        for lg in args.leagues:
+            for season in args.seasons:
+                ids.append(q.enqueue("backtest-slice", {**common, "league": lg, "season": season,
+                                                        "odds_file": args.odds_file, "cache_dir": args.cache_dir,
+                                                        "min_train": args.min_train, "warm_start": args.warm_start},
+                                     args.max_attempts))
+    else:
+        rng = random.Random(args.seed)
+        for lg in args.leagues:
+            for t in range(args.trials):
+                ids.append(q.enqueue("hparam", {**common, "league": lg, "date": args.date, "trial": t,
+                                                "params": sample_params(rng)}, args.max_attempts))
+    print(f"✅ {len(ids)} {args.kind} job(s) queued → {args.db}")
+
+
+def cmd_worker(args):
+    kinds = args.kinds or None
+    if args.procs <= 1:
+        worker_loop(args.db, args.results_dir, args.lease, args.idle_exit, args.max_jobs, kinds)
+        return
+    procs = [multiprocessing.Process(target=worker_loop,
+                                     args=(args.db, args.results_dir, args.lease, args.idle_exit, args.max_jobs, kinds))
+             for _ in range(args.procs)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+def cmd_status(args):
+    q = JobQueue(args.db)
+    for kind, status, n in q.counts():
+        print(f"{kind:<16}{status:<10}{n:>6}")
+    if args.failed:
+        for j in q.jobs(status="failed"):
+            print(f"\n#{j['id']} {j['kind']} {j['payload']} (attempts {j['attempts']})\n{j['error']}")
+    if args.best:
+        trials = [json.loads(j["result"]) for j in q.jobs("hparam", "done")]
+        for t in sorted(trials, key=lambda r: r["log_loss"])[:args.best]:
+            print(f"{t['league']:<4}{t['log_loss']:.4f}  acc {t['accuracy']:.3f}  {t['params']}")
+
+
+def cmd_collect(args):
+    import pandas as pd
+    from backtest import summarize
+
+    q = JobQueue(args.db)
+    parts = [json.loads(j["result"]).get("predictions") for j in q.jobs("backtest-slice", "done")]
+    parts = [pd.read_csv(p, parse_dates=["date"]) for p in parts if p and pathlib.Path(p).exists()]
+    if not parts:
+        sys.exit("No finished backtest-slice jobs with predictions")
+    preds = pd.concat(parts, ignore_index=True).sort_values(["league", "date"], ignore_index=True)
+    rows = [{"league": lg, "season": s, **summarize(g, args.min_edge)}
+            for (lg, s), g in preds.groupby(["league", "season"])]
+    rows.append({"league": "ALL", "season": "ALL", **summarize(preds, args.min_edge)})
+    summary = pd.DataFrame(rows)
+    out_path = pathlib.Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(out_path) as xl:
+        summary.to_excel(xl, sheet_name="summary", index=False)
+        preds.to_excel(xl, sheet_name="predictions", index=False)
+    print(summary.to_string(index=False))
+    print(f"✅ Backtest report ({len(parts)} slices) → {out_path}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SQLite job queue for training / backtest / hparam work")
+    ap.add_argument("--db", default=DEFAULT_DB, help="queue database (shared by all workers)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    en = sub.add_parser("enqueue", help="queue jobs")
+    en.add_argument("kind", choices=list(HANDLERS))
+    en.add_argument("--leagues", nargs="+", required=True)
+    en.add_argument("--date", default="", help="YYYY-MM-DD training cutoff (train / hparam)")
+    en.add_argument("--seasons", nargs="+", type=int, default=[], help="backtest-slice seasons")
+    en.add_argument("--trials", type=int, default=20, help="hparam draws per league")
+    en.add_argument("--seed", type=int, default=0)
+    en.add_argument("--engine", choices=["lgbm", "poisson", "ensemble"], default="lgbm")
+    en.add_argument("--data-dir", default="/mnt/data")
+    en.add_argument("--model-dir", default="/mnt/data/models")
+    en.add_argument("--output-dir", default="/mnt/data")
+    en.add_argument("--odds-file", default="")
+    en.add_argument("--cache-dir", default="/mnt/data/backtest_cache")
+    en.add_argument("--min-train", type=int, default=100)
+    en.add_argument("--warm-start", action="store_true")
+    en.add_argument("--max-attempts", type=int, default=3)
+
+    wk = sub.add_parser("worker", help="claim and run jobs")
+    wk.add_argument("--procs", type=int, default=1, help="worker processes on this host")
+    wk.add_argument("--kinds", nargs="*", default=[], help="only these job kinds")
+    wk.add_argument("--lease", type=float, default=120, help="lease seconds (renewed every lease/3)")
+    wk.add_argument("--idle-exit", type=float, default=5, help="exit after this many idle seconds (-1 = never)")
+    wk.add_argument("--max-jobs", type=int, default=0, help="exit after N jobs (0 = unlimited)")
+    wk.add_argument("--results-dir", default=DEFAULT_RESULTS)
+
+    st = sub.add_parser("status", help="job counts")
+    st.add_argument("--failed", action="store_true", help="print failed jobs with their errors")
+    st.add_argument("--best", type=int, default=0, help="show the N best hparam trials")
+
+    co = sub.add_parser("collect", help="merge backtest-slice results into one report")
+    co.add_argument("--output", default="/mnt/data/backtest_report.xlsx")
+    co.add_argument("--min-edge", type=float, default=0.0)
+    args = ap.parse_args()
+
+    if args.command == "enqueue":
+        if args.kind in ("train", "hparam") and not args.date:
+            ap.error(f"{args.kind} jobs need --date")
+        if args.kind == "backtest-slice" and not args.seasons:
+            ap.error("backtest-slice jobs need --seasons")
+    {"enqueue": cmd_enqueue, "worker": cmd_worker, "status": cmd_status, "collect": cmd_collect}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+lgbm_numpy.py
+-------------
+NumPy-only inference for the LightGBM models written by `train_models.py`.
+
+* export_model(): booster.dump_model() → flat node arrays (feature, threshold,
+  default_left, missing type, categorical sets, children) + leaf values, one
+  .npy per array and a meta.json (feature order, pandas categories, classes).
+  Needs lightgbm — run once after training (`train_models.py --export-numpy`)
+* NumpyLGBM: loads such a directory with np.load(mmap_mode="r") and evaluates
+  every tree for a whole batch of rows at once (rows × trees walked level by
+  level), reproducing LightGBM's numerical / categorical / missing-value
+  routing and the multiclass softmax.  Importing it pulls in numpy only;
+  pandas is used if a DataFrame is passed
+
+Usage:
+    python lgbm_numpy.py export --model /mnt/data/models/k2_lgbm.pkl --out /mnt/data/models/k2_lgbm_np
+    python lgbm_numpy.py verify --model /mnt/data/models/k2_lgbm.pkl --features /mnt/data/k2_matches_20250802.xlsx
+    python lgbm_numpy.py verify --model /mnt/data/models/lgbm_pooled.pkl --league K2 \
+        --features /mnt/data/k2_matches_20250802.xlsx
+    python lgbm_numpy.py predict --model-dir /mnt/data/models/k2_lgbm_np \
+        --features /mnt/data/k2_matches_20250802.xlsx --output /mnt/data/k2_predictions_np.xlsx
+"""
+
+import argparse, json, pathlib, sys, time
+
+import numpy as np
+
+ZERO_THRESHOLD = 1e-35               # LightGBM kZeroThreshold
+MISSING = {"None": 0, "Zero": 1, "NaN": 2}
+ARRAYS = ["feature", "threshold", "default_left", "missing", "cat_row", "left", "right",
+          "leaf_value", "root", "tree_class", "cat_sets"]
+
+
+def _flatten(tree_info: list) -> dict:
+    """Nested dump_model trees → global node / leaf arrays.
+
+    Children >= 0 are node indices, children < 0 are ~leaf indices (as in
+    LightGBM itself); a single-leaf tree has root = ~leaf.
+    """
+    feature, threshold, default_left, missing, cat_row, left, right = [], [], [], [], [], [], []
+    leaf_value, root, cat_lists = [], [], []
+
+    def walk(node) -> int:
+        if "leaf_value" in node or "split_feature" not in node:
+            leaf_value.append(node.get("leaf_value", 0.0))
+            return ~(len(leaf_value) - 1)
+        i = len(feature)
+        feature.append(node["split_feature"])
+        default_left.append(bool(node["default_left"]))
+        missing.append(MISSING[node["missing_type"]])
+        left.append(0)
+        right.append(0)
+        if node["decision_type"] == "==":
+            threshold.append(0.0)
+            cat_row.append(len(cat_lists))
+            cat_lists.append([int(c) for c in str(node["threshold"]).split("||")])
+        else:
+            threshold.append(float(node["threshold"]))
+            cat_row.append(-1)
+        left[i] = walk(node["left_child"])
+        right[i] = walk(node["right_child"])
+        return i
+
+    for t in tree_info:
+        root.append(walk(t["tree_structure"]))
+
+    width = max((max(c) for c in cat_lists), default=-1) + 1
+    cat_sets = np.zeros((len(cat_lists), max(width, 1)), dtype=bool)
+    for r, cats in enumerate(cat_lists):
+        cat_sets[r, cats] = True
+    return {
+        "feature": np.asarray(feature, dtype=np.int32),
+        "threshold": np.asarray(threshold, dtype=np.float64),
+        "default_left": np.asarray(default_left, dtype=bool),
+        "missing": np.asarray(missing, dtype=np.int8),
+        "cat_row": np.asarray(cat_row, dtype=np.int32),
+        "left": np.asarray(left, dtype=np.int32),
+        "right": np.asarray(right, dtype=np.int32),
+        "leaf_value": np.asarray(leaf_value, dtype=np.float64),
+        "root": np.asarray(root, dtype=np.int32),
+        "cat_sets": cat_sets,
+    }
+
+
+def export_model(model, out_dir, features=None) -> pathlib.Path:
+    """LGBMClassifier / Booster → directory of .npy arrays + meta.json."""
+    booster = getattr(model, "booster_", model)
+    dump = booster.dump_model()
+    arrays = _flatten(dump["tree_info"])
+    k = dump["num_tree_per_iteration"]
+    arrays["tree_class"] = np.arange(len(arrays["root"]), dtype=np.int32) % k
+
+    names = dump["feature_names"]
+    # categorical columns in training order (pandas_categorical is aligned with them); a column that was
+    # constant in the training rows (e.g. league in a per-league fine-tune) is absent from feature_infos
+    cat_idx = booster.params.get("categorical_column")
+    if cat_idx is None:
+        cat_idx = [i for i, n in enumerate(names) if dump["feature_infos"].get(n, {}).get("values")]
+    cat_names = [names[i] for i in sorted(cat_idx)]
+    categories = dict(zip(cat_names, dump.get("pandas_categorical") or []))
+    meta = {
+        "features": list(features) if features is not None else names,
+        "booster_features": names,
+        "objective": dump["objective"].split()[0],
+        "num_class": dump["num_class"],
+        "classes": [int(c) for c in getattr(model, "classes_", range(max(2, dump["num_class"])))],
+        "average_output": dump.get("average_output", False),
+        "categories": categories,
+    }
+
+    out = pathlib.Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    for name in ARRAYS:
+        np.save(out / f"{name}.npy", arrays[name])
+    (out / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding="utf-8")
+    return out
+
+
+class NumpyLGBM:
+    """Batch evaluator over the exported arrays (memory-mapped, read-only)."""
+
+    def __init__(self, model_dir):
+        d = pathlib.Path(model_dir)
+        self.meta = json.loads((d / "meta.json").read_text(encoding="utf-8"))
+        for name in ARRAYS:
+            # plain ndarray view over the mapping: pages load on first touch, no memmap subclass overhead
+            setattr(self, name, np.asarray(np.load(d / f"{name}.npy", mmap_mode="r")))
+        self.features = self.meta["features"]
+        self.classes_ = np.asarray(self.meta["classes"])
+        self.plain = not self.missing.any() and not (self.cat_row >= 0).any()
+        self.child = np.stack([self.right, self.left], axis=1)  # child[node, go_left]
+
+    def matrix(self, X) -> np.ndarray:
+        """DataFrame (any column order, pandas categoricals / strings) or array → float64 matrix."""
+        if not hasattr(X, "columns"):
+            return np.asarray(X, dtype=np.float64)
+        cols = []
+        for name in self.meta["booster_features"]:
+            src = name if name in X.columns else None
+            if src is None:  # booster names may be sanitized; fall back to training order
+                src = self.features[self.meta["booster_features"].index(name)]
+            col = X[src] if src in X.columns else None
+            if col is None:
+                cols.append(np.full(len(X), np.nan))
+            elif name in self.meta["categories"]:
+                lookup = {c: i for i, c in enumerate(self.meta["categories"][name])}
+                codes = [lookup.get(v, -1) for v in col.astype(object).where(col.notna(), None)]
+                cols.append(np.where(np.asarray(codes) < 0, np.nan, codes).astype(np.float64))
+            else:
+                cols.append(np.asarray(col, dtype=np.float64))
+        return np.column_stack(cols) if cols else np.zeros((len(X), 0))
+
+    def predict_raw(self, X) -> np.ndarray:
+        x = self.matrix(X)
+        n, T = len(x), len(self.root)
+        # no missing-value / categorical routing anywhere and no NaN input → bare threshold compares
+        plain = self.plain and not np.isnan(x).any()
+        k = max(1, self.meta["num_class"])
+        # flat (row, tree) work list; finished pairs drop out every level
+        xf, nf = x.ravel(), x.shape[1]
+        base = np.repeat(np.arange(n, dtype=np.int64) * nf, T)  # row offset into xf
+        nd = np.tile(self.root, n)
+        leaf = np.empty(n * T, dtype=np.int64)
+        pos = np.arange(n * T)
+        while len(pos):
+            done = nd < 0
+            if done.any():
+                leaf[pos[done]] = ~nd[done]
+                keep = ~done
+                base, nd, pos = base[keep], nd[keep], pos[keep]
+                if not len(pos):
+                    break
+            fval = xf.take(base + self.feature.take(nd))
+            if plain:
+                nd = self.child[nd, (fval <= self.threshold.take(nd)).view(np.int8)]
+                continue
+            miss = self.missing[nd]
+            nan = np.isnan(fval)
+
+            # numerical: NaN → 0 unless missing type is NaN; default branch for the missing value
+            num_val = np.where(nan & (miss != MISSING["NaN"]), 0.0, fval)
+            is_default = (((miss == MISSING["Zero"]) & (num_val > -ZERO_THRESHOLD) & (num_val <= ZERO_THRESHOLD))
+                          | ((miss == MISSING["NaN"]) & nan))
+            go_left = np.where(is_default, self.default_left[nd], num_val <= self.threshold[nd])
+
+            # categorical: NaN / negative / unseen → right, else bitset membership
+            cat = self.cat_row[nd]
+            is_cat = cat >= 0
+            if is_cat.any():
+                iv = np.where(nan | (fval < 0), -1, np.nan_to_num(fval)).astype(np.int64)
+                ok = is_cat & (iv >= 0) & (iv < self.cat_sets.shape[1])
+                member = np.zeros(len(nd), dtype=bool)
+                member[ok] = self.cat_sets[cat[ok], iv[ok]]
+                go_left = np.where(is_cat, member, go_left)
+
+            nd = self.child[nd, go_left.view(np.int8)]
+
+        values = self.leaf_value.take(leaf).reshape(n, T)
+        raw = np.zeros((n, k))
+        for c in range(k):
+            raw[:, c] = values[:, self.tree_class == c].sum(axis=1)
+        if self.meta["average_output"]:
+            raw /= max(1, T // k)
+        return raw
+
+    def predict_proba(self, X) -> np.ndarray:
+        raw = self.predict_raw(X)
+        obj = self.meta["objective"]
+        if obj in ("multiclass", "softmax"):
+            e = np.exp(raw - raw.max(axis=1, keepdims=True))
+            return e / e.sum(axis=1, keepdims=True)
+        if obj in ("binary", "cross_entropy", "xentropy"):
+            p = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1 - p, p])
+        raise ValueError(f"unsupported objective {obj!r}")
+
+
+def _load_pickle(path: str, league: str | None = None):
+    """train_models pickles → (model, features, pooled leagues or None).
+
+    Per league: {'model', 'features'}.  Pooled bundle: the league's fine-tuned
+    booster when `league` has one, else the shared model.
+    """
+    import joblib
+    obj = joblib.load(path)
+    if not isinstance(obj, dict):
+        return obj, None, None
+    if "leagues" in obj:
+        return obj["fine_tuned"].get(league, obj["model"]), obj["features"], obj["leagues"]
+    return obj["model"], obj.get("features"), None
+
+
+def _read_features(path: str):
+    import pandas as pd
+    return pd.read_csv(path) if path.endswith(".csv") else pd.read_excel(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="NumPy-only inference for exported LightGBM models")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="pickled model → .npy directory")
+    ex.add_argument("--model", required=True, help="train_models .pkl")
+    ex.add_argument("--out", required=True, help="output directory")
+    ex.add_argument("--league", default=None, help="pooled bundle: export this league's fine-tuned booster")
+    ve = sub.add_parser("verify", help="compare NumPy vs LightGBM predict_proba on a feature file")
+    ve.add_argument("--model", required=True)
+    ve.add_argument("--features", required=True, help="feature xlsx/csv")
+    ve.add_argument("--out", default="", help="export directory (default: temp dir)")
+    ve.add_argument("--league", default=None, help="pooled bundle: league of the feature file (if it has no 'league' column)")
+    pr = sub.add_parser("predict", help="score a feature file with an exported model")
+    pr.add_argument("--model-dir", required=True)
+    pr.add_argument("--features", required=True)
+    pr.add_argument("--output", required=True, help="xlsx with today_game_id + P_H/P_D/P_A")
+    args = ap.parse_args()
+
+    if args.command == "export":
+        model, feats, _ = _load_pickle(args.model, args.league)
+        print(f"✅ Exported → {export_model(model, args.out, feats)}")
+
+    elif args.command == "verify":
+        import tempfile
+        model, feats, leagues = _load_pickle(args.model, args.league)
+        df = _read_features(args.features)
+        if leagues is not None:
+            # pooled bundle: same matrix as train_models.predict_pooled (categorical league last)
+            from train_models import pooled_matrix
+            if args.league:
+                df = df.assign(league=args.league)
+            elif "league" not in df.columns:
+                sys.exit("ERROR: pooled model — pass --league or give the feature file a 'league' column")
+            X = pooled_matrix(df, feats, leagues)
+        else:
+            X = df.reindex(columns=feats or model.feature_name_)
+            num = [c for c in X.columns if X[c].dtype.name != "category"]
+            X[num] = X[num].fillna(0)  # same input train_models feeds LightGBM
+        out = args.out or tempfile.mkdtemp(prefix="lgbm_np_")
+        export_model(model, out, feats)
+        t0 = time.perf_counter()
+        ref = model.predict_proba(X)
+        t_lgb = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = NumpyLGBM(out).predict_proba(X)
+        t_np = time.perf_counter() - t0
+        err = float(np.abs(ref - got).max())
+        print(f"{len(X)} rows | max |Δp| {err:.2e} | lightgbm {1e3 * t_lgb:.1f} ms, numpy {1e3 * t_np:.1f} ms")
+        if err > 1e-9:
+            sys.exit("ERROR: NumPy runtime disagrees with LightGBM")
+
+    else:
+        df = _read_features(args.features)
+        model = NumpyLGBM(args.model_dir)
+        out = df[[c for c in ["today_game_id", "home_team", "away_team"] if c in df.columns]].copy()
+        X = df.reindex(columns=model.features)
+        out[["P_H", "P_D", "P_A"]] = model.predict_proba(X.fillna({c: 0 for c in X.columns
+                                                                   if c not in model.meta["categories"]}))
+        pathlib.Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        out.to_excel(args.output, index=False)
+        print(f"✅ Predictions → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+poisson_model.py
+----------------
+Dixon-Coles goals model — a cheap baseline / ensemble member next to the
+LightGBM classifier in train_models.py (--engine poisson|ensemble).
+
+    log λ_home = home_adv + att[home] - def[away]
+    log λ_away =            att[away] - def[home]
+    τ(x, y, ρ) rescales P(0-0), P(0-1), P(1-0), P(1-1)
+
+* Fitted by maximum likelihood (scipy L-BFGS-B, analytic gradient), with
+  optional exponential time decay `xi` per day so recent form weighs more
+* Scores every fixture in one batched pass: (n, G, G) scoreline matrices →
+  P_H/P_D/P_A plus exact-score probabilities the classifier cannot give
+* Teams unseen in training get average strength: the mean att / def of the
+  fitted teams (only Σ att = 0 is constrained, so the defence mean floats)
+
+Quick check on a feature file:
+    python poisson_model.py --feature-file /mnt/data/k2_matches_20250802.xlsx --date 2025-08-02
+"""
+
+import argparse, datetime as dt, time
+
+import numpy as np, pandas as pd
+from scipy.optimize import minimize
+from scipy.stats import poisson
+
+MAX_GOALS = 10  # scoreline matrix covers 0..MAX_GOALS goals per side
+
+
+class DixonColes:
+    def __init__(self, xi: float = 0.0, rho_bounds=(-0.2, 0.2)):
+        self.xi = xi
+        self.rho_bounds = rho_bounds
+        self.teams: pd.Index | None = None
+        self.attack = self.defence = None
+        self.home_adv = 0.0
+        self.rho = 0.0
+
+    # ------------------------------------------------------------------ fit
+    @staticmethod
+    def _nll(theta, hi, ai, x, y, w, n_teams):
+        att, dfn = theta[:n_teams], theta[n_teams:2 * n_teams]
+        home, rho = theta[-2], theta[-1]
+        eta1 = home + att[hi] - dfn[ai]
+        eta2 = att[ai] - dfn[hi]
+        lam, mu = np.exp(eta1), np.exp(eta2)
+
+        m00, m01 = (x == 0) & (y == 0), (x == 0) & (y == 1)
+        m10, m11 = (x == 1) & (y == 0), (x == 1) & (y == 1)
+        lm = lam * mu
+        tau = np.ones_like(lam)
+        tau[m00] = 1 - lm[m00] * rho
+        tau[m01] = 1 + lam[m01] * rho
+        tau[m10] = 1 + mu[m10] * rho
+        tau[m11] = 1 - rho
+        tau = np.maximum(tau, 1e-10)
+        # dτ/dη1, dτ/dη2, dτ/dρ
+        t1, t2, tr = np.zeros_like(lam), np.zeros_like(lam), np.zeros_like(lam)
+        t1[m00] = t2[m00] = -lm[m00] * rho
+        t1[m01] = lam[m01] * rho
+        t2[m10] = mu[m10] * rho
+        tr[m00], tr[m01], tr[m10], tr[m11] = -lm[m00], lam[m01], mu[m10], -1.0
+
+        ll = w * (np.log(tau) + x * eta1 - lam + y * eta2 - mu)
+        d1 = w * (x - lam + t1 / tau)
+        d2 = w * (y - mu + t2 / tau)
+
+        grad = np.empty_like(theta)
+        grad[:n_teams] = np.bincount(hi, d1, n_teams) + np.bincount(ai, d2, n_teams)
+        grad[n_teams:2 * n_teams] = -np.bincount(ai, d1, n_teams) - np.bincount(hi, d2, n_teams)
+        grad[-2] = d1.sum()
+        grad[-1] = (w * tr / tau).sum()
+
+        # identifiability: Σ att = 0
+        s = att.sum()
+        norm = w.sum()
+        grad[:n_teams] -= 2 * s * norm
+        return -(ll.sum() - s * s * norm) / norm, -grad / norm
+
+    def fit(self, home_team, away_team, home_goals, away_goals, dates=None):
+        codes, self.teams = pd.factorize(pd.concat([pd.Series(home_team), pd.Series(away_team)],
+                                                   ignore_index=True))
+        n = len(home_goals)
+        hi, ai = codes[:n], codes[n:]
+        x = np.asarray(home_goals, dtype=float)
+        y = np.asarray(away_goals, dtype=float)
+        w = np.ones(n)
+        if dates is not None and self.xi > 0:
+            d = pd.to_datetime(pd.Series(dates))
+            w = np.exp(-self.xi * (d.max() - d).dt.days.to_numpy(dtype=float))
+
+        n_teams = len(self.teams)
+        theta0 = np.concatenate([np.zeros(2 * n_teams), [0.25, 0.0]])
+        bounds = [(None, None)] * (2 * n_teams + 1) + [self.rho_bounds]
+        res = minimize(self._nll, theta0, args=(hi, ai, x, y, w, n_teams),
+                       jac=True, method="L-BFGS-B", bounds=bounds)
+        self.attack = res.x[:n_teams]
+        self.defence = res.x[n_teams:2 * n_teams]
+        self.home_adv, self.rho = float(res.x[-2]), float(res.x[-1])
+        return self
+
+    # -------------------------------------------------------------- predict
+    def expected_goals(self, home_team, away_team):
+        """(λ_home, λ_away) arrays; unknown teams use average strength."""
+        hi = self.teams.get_indexer(pd.Index(home_team))
+        ai = self.teams.get_indexer(pd.Index(away_team))
+        # index -1 → average team; the defence level is not pinned to 0 by the fit
+        att = np.append(self.attack, self.attack.mean())
+        dfn = np.append(self.defence, self.defence.mean())
+        lam = np.exp(self.home_adv + att[hi] - dfn[ai])
+        mu = np.exp(att[ai] - dfn[hi])
+        return lam, mu
+
+    def score_matrix(self, home_team, away_team, max_goals: int = MAX_GOALS) -> np.ndarray:
+        """(n, G, G) P(home goals = i, away goals = j) for every fixture."""
+        lam, mu = self.expected_goals(home_team, away_team)
+        return scoreline_matrix(lam, mu, self.rho, max_goals)
+
+    def predict_proba(self, home_team, away_team) -> np.ndarray:
+        return outcome_probs(self.score_matrix(home_team, away_team))
+
+
+def scoreline_matrix(lam, mu, rho: float, max_goals: int = MAX_GOALS) -> np.ndarray:
+    g = np.arange(max_goals + 1)
+    ph = poisson.pmf(g[None, :], np.asarray(lam, dtype=float)[:, None])
+    pa = poisson.pmf(g[None, :], np.asarray(mu, dtype=float)[:, None])
+    M = ph[:, :, None] * pa[:, None, :]
+    M[:, 0, 0] *= 1 - lam * mu * rho
+    M[:, 0, 1] *= 1 + lam * rho
+    M[:, 1, 0] *= 1 + mu * rho
+    M[:, 1, 1] *= 1 - rho
+    return M / M.sum(axis=(1, 2), keepdims=True)
+
+
+def outcome_probs(M: np.ndarray) -> np.ndarray:
+    """(n, 3) P_H/P_D/P_A from (n, G, G) scoreline matrices."""
+    lower = np.tri(M.shape[1], k=-1, dtype=bool)  # home goals > away goals
+    return np.stack([M[:, lower].sum(axis=1),
+                     np.trace(M, axis1=1, axis2=2),
+                     M[:, lower.T].sum(axis=1)], axis=1)
+
+
+def top_scores(M: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Most likely exact score ("h-a") and its probability per fixture."""
+    flat = M.reshape(len(M), -1).argmax(axis=1)
+    h, a = np.divmod(flat, M.shape[2])
+    labels = np.char.add(np.char.add(h.astype(str), "-"), a.astype(str))
+    return labels, M.reshape(len(M), -1)[np.arange(len(M)), flat]
+
+
+def fit_dixon_coles(df: pd.DataFrame, xi: float = 0.0) -> DixonColes:
+    """Fit on completed matches of a feature frame (home/away_team, home/away_score, date)."""
+    played = df.dropna(subset=["home_score", "away_score"])
+    return DixonColes(xi=xi).fit(played["home_team"], played["away_team"],
+                                 played["home_score"], played["away_score"],
+                                 played["date"] if "date" in played.columns else None)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fit Dixon-Coles on a feature file and report timings")
+    ap.add_argument("--feature-file", required=True, help="<league>_matches_YYYYMMDD.xlsx")
+    ap.add_argument("--date", required=True, help="YYYY-MM-DD (matches before this date used for fitting)")
+    ap.add_argument("--xi", type=float, default=0.0, help="time-decay per day (e.g. 0.0019)")
+    args = ap.parse_args()
+
+    cutoff = dt.datetime.strptime(args.date, "%Y-%m-%d")
+    df = pd.read_excel(args.feature_file)
+    df["date"] = pd.to_datetime(df["date"])
+
+    t0 = time.perf_counter()
+    dc = fit_dixon_coles(df[df["date"] < cutoff], xi=args.xi)
+    t1 = time.perf_counter()
+    M = dc.score_matrix(df["home_team"], df["away_team"])
+    probs = outcome_probs(M)
+    t2 = time.perf_counter()
+
+    print(f"teams={len(dc.teams)} home_adv={dc.home_adv:.3f} rho={dc.rho:.3f}")
+    print(f"fit {1e3 * (t1 - t0):.1f} ms | {len(df)} fixtures scored in {1e3 * (t2 - t1):.1f} ms")
+    if "result" in df.columns:
+        test = (df["date"] >= cutoff).to_numpy() & df["result"].notna().to_numpy()
+        if test.any():
+            y = df.loc[test, "result"].astype(int).to_numpy()
+            p = probs[test][np.arange(len(y)), y]
+            print(f"holdout n={len(y)} log_loss={-np.log(np.clip(p, 1e-15, 1)).mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ qual_numeric_converter.py
 Script to convert qualitative match analysis documents into quantitative scores
 based on predefined scoring criteria.
 
+Documents may hold several `== [game_id-team] ==` sections (see
+qual_multigame_template.py); each section becomes one record.  Without
+section headers the file name (match_id-team) is the key.
+
 Usage:
     python qual_numeric_converter.py --input_folder ./qual_docs --output_csv qual_numeric.csv
 """
@@ -12,9 +16,9 @@ Usage:
 import argparse
 import glob
 import os
-import re
 import pandas as pd
-from docx import Document
+
+from qual_numeric_converter_updated import docx_records
 
 # Scoring dictionaries -------------------------------------------------------
 SCORING = {
@@ -55,15 +59,6 @@ SCORING = {
     },
 }
 
-# Regular expressions to detect sections in docx -----------------------------
-SECTION_PATTERNS = {
-    "injury": re.compile(r"qual_injury[:\-]\s*(.*)", re.IGNORECASE),
-    "lineup": re.compile(r"qual_lineup[:\-]\s*(.*)", re.IGNORECASE),
-    "tactics": re.compile(r"qual_tactics[:\-]\s*(.*)", re.IGNORECASE),
-    "motivation": re.compile(r"qual_motivation[:\-]\s*(.*)", re.IGNORECASE),
-    "weather": re.compile(r"qual_weather[:\-]\s*(.*)", re.IGNORECASE),
-}
-
 def classify_text(text, category):
     """Return score for text based on keyword heuristics."""
     text = text.lower()
@@ -109,19 +104,6 @@ def classify_text(text, category):
         return 0
     return 0
 
-def parse_docx(filepath):
-    doc = Document(filepath)
-    full_text = "\n".join([p.text for p in doc.paragraphs])
-    scores = {}
-    for cat, pattern in SECTION_PATTERNS.items():
-        match = pattern.search(full_text)
-        if match:
-            extracted = match.group(1)
-            scores[cat] = classify_text(extracted, cat)
-        else:
-            scores[cat] = 0
-    return scores
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input_folder", required=True)
@@ -130,16 +112,9 @@ def main():
 
     records = []
     for filepath in glob.glob(os.path.join(args.input_folder, "*.docx")):
-        filename = os.path.basename(filepath)
-        match_id, team = filename.replace(".docx", "").rsplit("-", 1)
-        scores = parse_docx(filepath)
-        record = {
-            "match_id": match_id,
-            "team": team.upper(),
-            **{f"{k}_score": v for k, v in scores.items()},
-        }
-        record["qual_total_score"] = sum(scores.values())
-        records.append(record)
+        # one pass over the paragraphs, one record per game-team section
+        for rec in docx_records(filepath, classify=classify_text):
+            records.append({"match_id": rec.pop("today_game_id"), "team": rec.pop("team_code"), **rec})
 
     pd.DataFrame(records).to_csv(args.output_csv, index=False)
     print(f"Saved {len(records)} records to {args.output_csv}")
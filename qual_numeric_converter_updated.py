@@ -7,6 +7,9 @@ qual_numeric_converter_updated.py
 3. 출력 컬럼명을 today_game_id, team_code 로 정규화했습니다 (pipeline 호환).
 4. 파일명 규칙 오류가 있어도 스킵하고 경고만 출력합니다.
 5. classify_text() 로직 및 SCORING 사전을 그대로 유지하되, 필요한 경우 확장 가능.
+6. 한 문서에 여러 경기/팀 섹션(`== [game_id-team] ==`, qual_multigame_template.py)이
+   있으면 문단을 한 번만 훑으며 섹션마다 레코드를 생성합니다. 섹션 헤더가 없으면
+   기존처럼 파일명(match_id-team_code)을 키로 사용합니다.
 
 사용 예시 (GPT 에이전트모드):
 python qual_numeric_converter_updated.py \
@@ -50,6 +53,9 @@ SECTION_PATTERNS = {
     "weather": re.compile(r"qual_weather[:\-]\s*(.*)", re.IGNORECASE),
 }
 
+# `== [20250802-K2-GYE-BUS-GYE] ==` → 키 = game_id-team_code
+SECTION_HEADER = re.compile(r"^\s*==\s*\[\s*(.+?)\s*\]\s*==\s*$")
+
 # ----------------------------- 유틸 함수 --------------------------------------
 
 def classify_text(text: str, category: str) -> int:
@@ -67,20 +73,67 @@ def classify_text(text: str, category: str) -> int:
     return 0
 
 
-def parse_docx(path: Path) -> dict:
-    """DOCX 파일에서 섹션별 텍스트를 추출해 점수를 계산."""
-    doc = Document(path)
-    full_text = "\n".join(p.text for p in doc.paragraphs)
+def score_text(text: str, classify=classify_text) -> dict:
+    """텍스트 블록(문서 전체 또는 한 섹션)의 카테고리별 점수."""
     scores = {}
     for cat, pat in SECTION_PATTERNS.items():
-        m = pat.search(full_text)
+        m = pat.search(text)
         if m:
-            scores[cat] = classify_text(m.group(1), cat)
+            scores[cat] = classify(m.group(1), cat)
         else:
             scores[cat] = 0
     return scores
 
 
+def parse_docx(path: Path) -> dict:
+    """DOCX 파일에서 섹션별 텍스트를 추출해 점수를 계산."""
+    doc = Document(path)
+    return score_text("\n".join(p.text for p in doc.paragraphs))
+
+
+def iter_sections(paragraphs):
+    """문단을 한 번 순회하며 (헤더 키, 본문) 을 순서대로 생성. 헤더가 없으면 (None, 전체 본문)."""
+    key, lines, seen_header = None, [], False
+    for text in paragraphs:
+        m = SECTION_HEADER.match(text)
+        if m:
+            if seen_header:
+                yield key, "\n".join(lines)
+            key, lines, seen_header = m.group(1), [], True
+        else:
+            lines.append(text)
+    yield key, "\n".join(lines)  # 마지막 섹션 (또는 헤더 없는 문서 전체)
+
+
+def _record(match_id: str, team_code: str, scores: dict) -> dict:
+    record = {
+        "today_game_id": match_id,
+        "team_code": team_code.upper(),
+        **{f"{k}_score": v for k, v in scores.items()},
+    }
+    record["qual_total_score"] = sum(scores.values())
+    return record
+
+
+def docx_records(path: Path, classify=classify_text) -> list[dict]:
+    """DOCX 한 파일 → qual 레코드 목록 (섹션당 1건, 섹션이 없으면 파일명 키로 1건)."""
+    path = Path(path)
+    paragraphs = (p.text for p in Document(path).paragraphs)
+    records = []
+    for key, body in iter_sections(paragraphs):
+        if key is None:  # 섹션 헤더 없는 단일 경기 문서 → 파일명 규칙
+            key, where = path.stem, f"{path.name} (match_id-team_code 형태 필요)"
+        else:
+            where = f"{path.name} 섹션 [{key}]"
+        try:
+            match_id, team_code = key.rsplit("-", 1)
+        except ValueError:
+            sys.stderr.write(f"[스킵] 키 규칙 불일치 → {where}\n")
+            continue
+        records.append(_record(match_id, team_code, score_text(body, classify)))
+    return records
+
+
 def discover_files(folder: Path, recursive: bool) -> list[Path]:
     if recursive:
         pattern = "**/*.docx"
@@ -112,23 +165,7 @@ def main():
         sys.stderr.write(f"[오류] DOCX 파일을 찾지 못했습니다: {input_path}\n")
         sys.exit(1)
 
-    records = []
-    for f in files:
-        fname = f.stem  # without extension
-        try:
-            match_id, team_code = fname.rsplit("-", 1)
-        except ValueError:
-            sys.stderr.write(f"[스킵] 파일명 규칙 불일치 → {fname}.docx (match_id-team_code 형태 필요)\n")
-            continue
-
-        scores = parse_docx(f)
-        record = {
-            "today_game_id": match_id,
-            "team_code": team_code.upper(),
-            **{f"{k}_score": v for k, v in scores.items()},
-        }
-        record["qual_total_score"] = sum(scores.values())
-        records.append(record)
+    records = [rec for f in files for rec in docx_records(f)]
 
     if not records:
         sys.stderr.write("[오류] 유효한 레코드가 하나도 없습니다. 파일명 규칙을 확인하세요.\n")
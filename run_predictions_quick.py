@@ -4,13 +4,19 @@
 run_predictions_quick.py
 ------------------------
 * Loads calibrated prediction XLSX for J2, K1, K2
-* Merges qualitative CSV
-* Calculates ΔP vs market odds (if odds CSV provided)
+* Merges qualitative CSV pivoted to one row per game (home_/away_/diff_*_score,
+  1:1 join on game_key, see team_keys.py)
+* Calculates ΔP vs market odds (if odds CSV provided) + EV / fractional Kelly per outcome
+* --bankroll: simultaneous-Kelly stake sheet (staking.py)
 * Flags upsets & multi‑cover picks (simplified rule)
 * Outputs Excel report ready for betting sheet.
 """
 
-import argparse, pandas as pd, pathlib, numpy as np
+import argparse, pandas as pd, pathlib
+
+from team_keys import TeamRegistry, encode_fixtures, encode_qual, encode_game_ids, pivot_qual
+from soccer_agent_pipeline import flag_upsets
+from staking import add_ev_columns, stake_table
 
 def load_pred(lg: str, date: str):
     path = pathlib.Path(f"/mnt/data/{lg.lower()}_predictions_calibrated.xlsx")
@@ -28,49 +34,66 @@ def load_odds(odds_file: str):
         return odds
     return pd.DataFrame()
 
+def load_matchday(date: str, leagues, registry: TeamRegistry) -> pd.DataFrame:
+    """Prediction rows of the day with integer keys (home_id / away_id / game_key)."""
+    df = pd.concat([load_pred(lg, date) for lg in leagues], ignore_index=True)
+    return encode_fixtures(df, None, registry)  # league column → J/K alias namespace
+
+def attach_qual(df: pd.DataFrame, qual: pd.DataFrame, registry: TeamRegistry) -> pd.DataFrame:
+    if "game_key" not in qual.columns:
+        qual = encode_qual(qual, df, registry=registry)
+    return df.merge(pivot_qual(qual), left_on="game_key", right_index=True, how="left", validate="many_to_one")
+
+def attach_odds(df: pd.DataFrame, odds: pd.DataFrame, registry: TeamRegistry) -> pd.DataFrame:
+    """Merge market odds and add ΔP_* = model − market."""
+    if odds.empty:
+        return df
+    if "game_key" not in odds.columns:
+        odds = odds.assign(game_key=encode_game_ids(odds["today_game_id"], df, registry=registry))
+    odds = odds[odds["game_key"] > 0].drop(columns=["today_game_id"], errors="ignore")
+    odds = odds.drop_duplicates("game_key", keep="last")  # one quote per game, as in watch_matchday
+    df = df.merge(odds, on="game_key", how="left", validate="many_to_one")
+    for col_model, col_market in [("P_H", "P_H_market"), ("P_D", "P_D_market"), ("P_A", "P_A_market")]:
+        if col_market in df.columns:
+            df[f"Δ{col_model}"] = df[col_model] - df[col_market]
+    return df
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--date", required=True, help="YYYY-MM-DD")
     p.add_argument("--qual-file", required=True, help="qual_numeric CSV")
     p.add_argument("--odds-file", default="", help="market odds CSV (optional)")
     p.add_argument("--output", required=True, help="Excel report path")
+    p.add_argument("--kelly-fraction", type=float, default=0.25, help="fractional Kelly multiplier")
+    p.add_argument("--bankroll", type=float, default=0, help="add a 'stakes' sheet sized for this bankroll")
+    p.add_argument("--max-legs", type=int, default=1, help="combo size for the stakes sheet (1 = singles)")
     args = p.parse_args()
 
     leagues = ["J2", "K1", "K2"]
-    df = pd.concat([load_pred(lg, args.date) for lg in leagues], ignore_index=True)
+    registry = TeamRegistry.load()
+    df = load_matchday(args.date, leagues, registry)
 
     # Merge qualitative
-    qual = pd.read_csv(args.qual_file)
-    df = df.merge(qual, on=["today_game_id", "team_code"], how="left")
+    df = attach_qual(df, pd.read_csv(args.qual_file), registry)
 
     # ΔP if odds provided
     if args.odds_file:
-        odds = load_odds(args.odds_file)
-        if not odds.empty:
-            df = df.merge(odds, on="today_game_id", how="left")
-            for col_model, col_market in [("P_H", "P_H_market"), ("P_D", "P_D_market"), ("P_A", "P_A_market")]:
-                if col_market in df.columns:
-                    df[f"Δ{col_model}"] = df[col_model] - df[col_market]
-
-    # Upset flag (motivation_score >=1.5 or max P <0.37)
-    df["is_upset"] = df.apply(
-        lambda r: (abs(float(r.get("motivation_score", 0))) >= 1.5) or
-                  (r[["P_H", "P_D", "P_A"]].max() < 0.37),
-        axis=1
-    )
+        df = attach_odds(df, load_odds(args.odds_file), registry)
+        df = add_ev_columns(df, args.kelly_fraction)
 
-    # Multi‑cover pick: top 4 highest entropy games
-    probs = df[["P_H", "P_D", "P_A"]].values
-    ent = -np.sum(probs * np.log(probs + 1e-9), axis=1)
-    df["entropy"] = ent
-    df = df.sort_values("entropy", ascending=False)
-    df["cover_flag"] = False
-    df.loc[df.head(4).index, "cover_flag"] = True
+    # Upset flag (motivation gap >=1.5 or max P <0.37) + multi‑cover pick: top 4 highest entropy games
+    df = flag_upsets(df)
 
     # Save
     out_path = pathlib.Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_excel(out_path, index=False)
+    if args.bankroll > 0:
+        stakes = stake_table(df, args.bankroll, args.max_legs, fraction=args.kelly_fraction)
+        with pd.ExcelWriter(out_path) as xl:
+            df.to_excel(xl, sheet_name="report", index=False)
+            stakes.to_excel(xl, sheet_name="stakes", index=False)
+    else:
+        df.to_excel(out_path, index=False)
     print(f"✅ Report saved → {out_path}")
 
 if __name__ == "__main__":
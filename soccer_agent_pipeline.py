@@ -21,11 +21,14 @@ NOTE:
 
 import argparse
 import datetime as dt
+import glob
 import pathlib
 import sys
 import pandas as pd
 import numpy as np
 
+ROOT = pathlib.Path(__file__).resolve().parent
+
 
 # --------------------------------------------------------------------- #
 #  Helper functions (stubs)                                             #
@@ -37,19 +40,24 @@ def update_data(match_date, leagues, include_qual):
     return {lg: pd.DataFrame() for lg in leagues}
 
 
-def engineer_features(datasets, include_qual):# --- AUTO MERGE QUALITATIVE CSVs ---
-    import glob, pandas as pd
-    qual_files = glob.glob(str(ROOT / 'qual_numeric_*.csv'))
+def engineer_features(datasets, include_qual):
+    print(f"[2/6] Feature engineering (include_qualitative={include_qual})")
+    # --- AUTO MERGE QUALITATIVE CSVs ---
+    qual_files = glob.glob(str(ROOT / 'qual_numeric_*.csv')) if include_qual else []
     if qual_files:
-    qual_df = pd.concat([pd.read_csv(f) for f in qual_files], ignore_index=True)
-    # Merge on today_game_id & team_code
-    df = df.merge(qual_df, on=['today_game_id', 'team_code'], how='left')
+        from team_keys import encode_qual, pivot_qual
+        qual_df = pd.concat([pd.read_csv(f) for f in qual_files], ignore_index=True)
+        # One row per game (home_/away_/diff_*_score), 1:1 join on game_key from update_matches ingest
+        datasets = {
+            lg: df.merge(pivot_qual(encode_qual(qual_df, df, lg)), left_on='game_key', right_index=True,
+                         how='left', validate='many_to_one')
+            if 'game_key' in df.columns else df
+            for lg, df in datasets.items()
+        }
     # -----------------------------------
-
-    print(f"[2/6] Feature engineering (include_qualitative={include_qual})")
-    # TODO: numeric processing, merge qual csv, scaling, encoding…
+    # TODO: numeric processing, scaling, encoding…
     # Return X_train, y_train, qual_df, etc.
-    return {lg: pd.DataFrame() for lg in datasets}
+    return datasets
 
 
 def retrain_model(feature_dict):
@@ -65,28 +73,29 @@ def predict(models, features, collect_odds, match_date):
     return predictions
 
 
+def flag_upsets(df, n_cover=4):
+    '''Add is_upset / entropy / cover_flag to one prediction frame.'''
+    if not {'P_H', 'P_D', 'P_A'} <= set(df.columns):
+        return df  # nothing predicted for this league (e.g. the predict() stub) → leave as is
+    df = df.copy()
+    probs = df[['P_H', 'P_D', 'P_A']].to_numpy(dtype=float)
+    # upset flag (home-away motivation gap >=1.5 or max P <0.37); per-team motivation_score in older frames
+    col = next((c for c in ('diff_motivation_score', 'motivation_score') if c in df.columns), None)
+    motivation = (pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy()
+                  if col else np.zeros(len(df)))
+    df['is_upset'] = (np.abs(motivation) >= 1.5) | (probs.max(axis=1) < 0.37)
+    # entropy & cover selection (top‑4 highest entropy)
+    df['entropy'] = -np.sum(probs * np.log(probs + 1e-12), axis=1)
+    df = df.sort_values('entropy', ascending=False)
+    df['cover_flag'] = False
+    df.loc[df.head(n_cover).index, 'cover_flag'] = True
+    return df
+
+
 def scan_upsets(predictions):
     '''Return dict[league] -> dataframe with upset & cover flags.'''
     print('[5/6] Scanning for upsets & deciding multi-cover strategy')
-    out = {}
-    import numpy as np
-    for lg, df in predictions.items():
-        df = df.copy()
-        # upset flag
-        df['is_upset'] = df.apply(
-            lambda r: (abs(float(r.get('motivation_score', 0))) >= 1.5)
-                      or (r[['P_H', 'P_D', 'P_A']].max() < 0.37),
-            axis=1
-        )
-        # entropy & cover selection (top‑4 highest entropy)
-        probs = df[['P_H', 'P_D', 'P_A']].values
-        entropy = -np.sum(probs * np.log(probs + 1e-12), axis=1)
-        df['entropy'] = entropy
-        df = df.sort_values('entropy', ascending=False)
-        df['cover_flag'] = False
-        df.loc[df.head(4).index, 'cover_flag'] = True
-        out[lg] = df
-    return out
+    return {lg: flag_upsets(df) for lg, df in predictions.items()}
 
 
 
@@ -132,7 +141,7 @@ def main():
         sys.exit("ERROR: --date must be YYYY‑MM‑DD")
 
     # 1. Update data
-    datasets = update_data(match_date, args.leagues, args.include_qual) if args.update_data else {}
+    datasets = update_data(match_date, args.leagues, args.include_qualitative) if args.update_data else {}
 
     # 2. Feature engineering
     feats = engineer_features(datasets, args.include_qualitative) if args.feature_engineering else {}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+soccer_cli.py
+-------------
+Single entry point for the 용축구확률 tools.
+
+  update         → update_matches.py  (update_all_matches.py with --all)
+  backfill       → backfill_matches.py (chunked, resumable multi-season fetch)
+  convert-qual   → qual_numeric_converter_updated.py
+  train          → train_models.py
+  explain        → explain_models.py (pred_contrib feature weights per league)
+  np-model       → lgbm_numpy.py (export / verify / numpy-only predict)
+  predict        → run_predictions_quick.py
+  scan           → upset + multi-cover scan of a prediction file
+  report         → soccer_agent_pipeline.py
+  jobs           → job_queue.py (enqueue / worker / status / collect)
+  bench-imports  → startup / import-time benchmark of the tools above
+
+Only the standard library is imported at module level.  pandas, numpy,
+lightgbm, joblib and python-docx are imported inside the subcommand that
+needs them, so `--help`, typos and cron health-checks return instantly.
+Arguments after the subcommand are forwarded unchanged to the script:
+
+    python soccer_cli.py train --date 2025-08-02 --leagues J2 K1 K2
+    python soccer_cli.py predict --help
+    python soccer_cli.py bench-imports --repeat 5
+"""
+
+import argparse, importlib, pathlib, statistics, subprocess, sys, time
+
+THIS_DIR = pathlib.Path(__file__).resolve().parent
+
+# subcommand -> (module, help)
+DELEGATES = {
+    "update":       ("update_matches", "Fetch FootyStats matches → feature xlsx"),
+    "backfill":     ("backfill_matches", "Resumable multi-season FootyStats backfill"),
+    "convert-qual": ("qual_numeric_converter_updated", "Qualitative DOCX → qual_numeric CSV"),
+    "train":        ("train_models", "Train per-league models + calibrated predictions"),
+    "explain":      ("explain_models", "Feature weights per league from cached pred_contrib"),
+    "np-model":     ("lgbm_numpy", "Export LightGBM models to numpy arrays / numpy-only scoring"),
+    "predict":      ("run_predictions_quick", "Matchday report with ΔP / upset / cover flags"),
+    "report":       ("soccer_agent_pipeline", "End-to-end agent pipeline"),
+    "jobs":         ("job_queue", "SQLite job queue for train / backtest / hparam workers"),
+}
+
+# modules timed by bench-imports (heaviest first)
+HEAVY_MODULES = ["lightgbm", "sklearn", "pandas", "scipy", "numpy", "joblib", "docx", "requests"]
+
+
+def run_module(module: str, argv: list[str]):
+    """Import `module` lazily and run its main() as if invoked from the shell."""
+    if str(THIS_DIR) not in sys.path:
+        sys.path.insert(0, str(THIS_DIR))
+    mod = importlib.import_module(module)
+    saved = sys.argv
+    sys.argv = [f"{module}.py", *argv]
+    try:
+        mod.main()
+    finally:
+        sys.argv = saved
+
+
+def cmd_update(argv: list[str]):
+    if "--all" in argv:
+        argv = [a for a in argv if a != "--all"]
+        run_module("update_all_matches", argv)
+    else:
+        run_module("update_matches", argv)
+
+
+def cmd_scan(argv: list[str]):
+    ap = argparse.ArgumentParser(prog="soccer_cli.py scan",
+                                 description="Upset + multi-cover scan of a prediction file")
+    ap.add_argument("--input", required=True, help="prediction xlsx/csv (needs P_H, P_D, P_A)")
+    ap.add_argument("--output", required=True, help="Excel path for flagged predictions")
+    ap.add_argument("--league", default="", help="league label when the file has no 'league' column")
+    args = ap.parse_args(argv)
+
+    import pandas as pd
+    from soccer_agent_pipeline import scan_upsets
+
+    path = pathlib.Path(args.input)
+    df = pd.read_csv(path) if path.suffix.lower() == ".csv" else pd.read_excel(path)
+    if "league" not in df.columns:
+        df["league"] = args.league or path.stem.split("_")[0].upper()
+    flagged = scan_upsets({lg: g for lg, g in df.groupby("league", sort=False)})
+
+    out_path = pathlib.Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(out_path) as xl:
+        for lg, g in flagged.items():
+            g.to_excel(xl, sheet_name=f"{lg}_upset", index=False)
+    print(f"✅ Scan saved → {out_path}")
+
+
+def _time_cmd(cmd: list[str], repeat: int) -> list[float]:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=THIS_DIR)
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+
+def cmd_bench_imports(argv: list[str]):
+    ap = argparse.ArgumentParser(prog="soccer_cli.py bench-imports",
+                                 description="Wall-clock startup of each tool and its heavy imports")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per measurement (median reported)")
+    args = ap.parse_args(argv)
+
+    py = sys.executable
+    rows = [("python (bare)", [py, "-c", "pass"]),
+            ("soccer_cli.py --help", [py, str(THIS_DIR / "soccer_cli.py"), "--help"])]
+    for module, _ in DELEGATES.values():
+        rows.append((f"{module}.py --help", [py, str(THIS_DIR / f"{module}.py"), "--help"]))
+    for module in HEAVY_MODULES:
+        rows.append((f"import {module}", [py, "-c", f"import {module}"]))
+
+    print(f"{'command':<48}{'median s':>10}{'min s':>10}")
+    for label, cmd in rows:
+        runs = _time_cmd(cmd, args.repeat)
+        print(f"{label:<48}{statistics.median(runs):>10.3f}{min(runs):>10.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="soccer_cli.py",
+                                 description="용축구확률 tools (heavy imports deferred per subcommand)")
+    sub = ap.add_subparsers(dest="command", metavar="<command>", required=True)
+    for name, (_, help_) in DELEGATES.items():
+        # add_help=False so `<command> --help` reaches the underlying script
+        sub.add_parser(name, help=help_, add_help=False)
+    sub.add_parser("scan", help="Upset + multi-cover scan of a prediction file", add_help=False)
+    sub.add_parser("bench-imports", help="Startup / import-time benchmark", add_help=False)
+    args, rest = ap.parse_known_args()
+
+    if args.command == "update":
+        cmd_update(rest)
+    elif args.command == "scan":
+        cmd_scan(rest)
+    elif args.command == "bench-imports":
+        cmd_bench_imports(rest)
+    else:
+        run_module(DELEGATES[args.command][0], rest)
+
+
+if __name__ == "__main__":
+    main()
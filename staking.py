@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+staking.py
+----------
+Expected value + Kelly staking on top of the ΔP report.
+
+* ev_table(): EV and fractional-Kelly stake for every outcome (H/D/A) of every
+  fixture in one vectorized pass — (n, 3) arrays, no row loop
+* candidate_bets(): +EV singles and, optionally, 2..k-leg combos across
+  different games (payout = product of leg odds)
+* simultaneous_kelly(): maximizes E[log bankroll] over all candidates at once.
+  Games are simulated independently from P_H/P_D/P_A; singles and combos
+  sharing a game are correlated through the shared scenario.  Solved by
+  projected gradient ascent under per-bet, per-game and total exposure caps
+
+Odds: decimal odds_H/odds_D/odds_A if present, otherwise 1 / P_*_market,
+otherwise the stored FootyStats pre-match prices (feat_odds_ft_1/x/2).
+
+Usage:
+    python staking.py --report /mnt/data/report_20250802.xlsx --bankroll 100000 \
+        --max-legs 2 --output /mnt/data/stakes_20250802.xlsx
+"""
+
+import argparse, itertools, pathlib, time
+
+import numpy as np, pandas as pd
+
+OUTCOMES = ["H", "D", "A"]
+PROB_COLS = ["P_H", "P_D", "P_A"]
+STORED_ODDS = ["feat_odds_ft_1", "feat_odds_ft_x", "feat_odds_ft_2"]  # update_matches pre-match prices
+
+
+def decimal_odds(df: pd.DataFrame) -> np.ndarray:
+    """(n, 3) decimal odds for H/D/A; NaN where no price is stored.
+
+    Per row, the first priced source wins: odds_H/D/A, 1 / P_*_market, then
+    the FootyStats pre-match prices kept in the feature store (feat_odds_ft_*,
+    0 there means unpriced).
+    """
+    out = np.full((len(df), 3), np.nan)
+    for cols, implied in [(["odds_H", "odds_D", "odds_A"], False),
+                          (["P_H_market", "P_D_market", "P_A_market"], True),
+                          (STORED_ODDS, False)]:
+        if not set(cols) <= set(df.columns):
+            continue
+        v = df[cols].to_numpy(dtype=float)
+        if implied:
+            with np.errstate(divide="ignore"):
+                v = np.where(v > 0, 1.0 / v, np.nan)
+        v = np.where(v > 1, v, np.nan)
+        fill = np.isnan(out).all(axis=1, keepdims=True)
+        out = np.where(fill, v, out)
+    return out
+
+
+def ev_table(P: np.ndarray, odds: np.ndarray, fraction: float = 0.25) -> tuple[np.ndarray, np.ndarray]:
+    """EV per unit stake and fractional-Kelly bankroll share, both (n, 3); 0 where unpriced."""
+    odds = np.nan_to_num(odds, nan=0.0)
+    ev = np.where(odds > 1, P * odds - 1, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kelly = np.where(odds > 1, ev / (odds - 1), 0.0)
+    return ev, fraction * np.clip(kelly, 0.0, None)
+
+
+def add_ev_columns(df: pd.DataFrame, fraction: float = 0.25) -> pd.DataFrame:
+    ev, kelly = ev_table(df[PROB_COLS].to_numpy(dtype=float), decimal_odds(df), fraction)
+    df = df.copy()
+    df[[f"EV_{o}" for o in OUTCOMES]] = ev
+    df[[f"kelly_{o}" for o in OUTCOMES]] = kelly
+    return df
+
+
+def candidate_bets(P: np.ndarray, odds: np.ndarray, max_legs: int = 1, min_ev: float = 0.0) -> dict:
+    """Singles with EV > min_ev plus combos of them over distinct games.
+
+    Returns legs (B, max_legs) game/outcome index arrays padded with -1,
+    payout odds (B,) and model win probability (B,).
+    """
+    ev, _ = ev_table(P, odds, 1.0)
+    g, o = np.nonzero(ev > min_ev)
+    singles = list(zip(g.tolist(), o.tolist()))
+    bets = [(leg,) for leg in singles]
+    for k in range(2, max_legs + 1):
+        for combo in itertools.combinations(singles, k):
+            games = [leg[0] for leg in combo]
+            if len(set(games)) == k:
+                bets.append(combo)
+
+    B = len(bets)
+    leg_game = np.full((B, max(1, max_legs)), -1, dtype=np.int64)
+    leg_out = np.full_like(leg_game, -1)
+    for i, combo in enumerate(bets):
+        for j, (gi, oi) in enumerate(combo):
+            leg_game[i, j], leg_out[i, j] = gi, oi
+    valid = leg_game >= 0
+    gi, oi = np.where(valid, leg_game, 0), np.where(valid, leg_out, 0)
+    price = np.where(valid, np.nan_to_num(odds)[gi, oi], 1.0).prod(axis=1)
+    prob = np.where(valid, P[gi, oi], 1.0).prod(axis=1)
+    return {"leg_game": leg_game, "leg_out": leg_out, "odds": price, "prob": prob}
+
+
+def _project(f, upper, per_game_cap, total_cap, bet_games):
+    """Feasible point near f: box → per-game exposure scaling → total scaling."""
+    f = np.clip(f, 0.0, upper)
+    if per_game_cap is not None:
+        exposure = np.zeros(bet_games.max() + 1)
+        for col in bet_games.T:
+            m = col >= 0
+            np.add.at(exposure, col[m], f[m])
+        scale = np.minimum(1.0, per_game_cap / np.maximum(exposure, 1e-12))
+        worst = np.ones_like(f)
+        for col in bet_games.T:
+            m = col >= 0
+            worst[m] = np.minimum(worst[m], scale[col[m]])
+        f = f * worst
+    total = f.sum()
+    return f * (total_cap / total) if total > total_cap else f
+
+
+def simultaneous_kelly(P: np.ndarray, bets: dict, fraction: float = 0.25, max_bet: float = 0.05,
+                       per_game_cap: float | None = 0.10, total_cap: float = 0.30,
+                       n_scenarios: int = 4000, iters: int = 300, seed: int = 0) -> np.ndarray:
+    """Bankroll share per candidate bet maximizing mean log growth (scaled by `fraction`)."""
+    B = len(bets["odds"])
+    if B == 0:
+        return np.zeros(0)
+    if not 0 < total_cap < 1:
+        raise ValueError("total_cap must be in (0, 1) so bankroll stays positive")
+
+    # scenarios: one sampled outcome per game, shared by every bet on that game
+    rng = np.random.default_rng(seed)
+    cdf = np.cumsum(P, axis=1)
+    outcome = (rng.random((n_scenarios, len(P)))[:, :, None] > cdf[None, :, :-1]).sum(axis=2)
+    win = np.ones((n_scenarios, B), dtype=bool)
+    for j in range(bets["leg_game"].shape[1]):
+        g, o = bets["leg_game"][:, j], bets["leg_out"][:, j]
+        m = g >= 0
+        win[:, m] &= outcome[:, g[m]] == o[m]
+    R = (win * bets["odds"][None, :] - 1.0).astype(np.float32)  # return per unit stake
+
+    # optimize full Kelly (caps pre-scaled by 1/fraction), then scale and re-apply the real caps
+    upper = np.full(B, max_bet / max(fraction, 1e-12))
+    cap_game = per_game_cap / max(fraction, 1e-12) if per_game_cap is not None else None
+    cap_total = min(total_cap / max(fraction, 1e-12), 0.999)
+
+    def growth(f):
+        return np.log1p(R @ f.astype(np.float32)).mean()  # stay float32: no per-call upcast of R
+
+    edge = bets["prob"] * bets["odds"] - 1
+    f = _project(np.clip(edge / np.maximum(bets["odds"] - 1, 1e-12), 0, None),
+                 upper, cap_game, cap_total, bets["leg_game"])
+    val, step = growth(f), 1.0
+    for _ in range(iters):
+        grad = (R.T @ (1.0 / (1.0 + R @ f.astype(np.float32)))).astype(float) / n_scenarios
+        while step > 1e-8:
+            cand = _project(f + step * grad, upper, cap_game, cap_total, bets["leg_game"])
+            cval = growth(cand)
+            if cval >= val:
+                break
+            step *= 0.5
+        if step <= 1e-8 or cval - val < 1e-10:
+            break
+        f, val, step = cand, cval, step * 2.0
+    return _project(fraction * f, max_bet, per_game_cap, total_cap, bets["leg_game"])
+
+
+def stake_table(df: pd.DataFrame, bankroll: float, max_legs: int = 1, **kelly_kw) -> pd.DataFrame:
+    """One row per candidate bet with EV, independent and simultaneous Kelly stakes."""
+    P = df[PROB_COLS].to_numpy(dtype=float)
+    odds = decimal_odds(df)
+    bets = candidate_bets(P, odds, max_legs)
+    f = simultaneous_kelly(P, bets, **kelly_kw)
+    fraction = kelly_kw.get("fraction", 0.25)
+
+    ids = df["today_game_id"].astype(str).to_numpy()
+    labels = []
+    for gs, os_ in zip(bets["leg_game"], bets["leg_out"]):
+        labels.append(" + ".join(f"{ids[g]}:{OUTCOMES[o]}" for g, o in zip(gs, os_) if g >= 0))
+    legs = (bets["leg_game"] >= 0).sum(axis=1)
+    ev = bets["prob"] * bets["odds"] - 1
+    out = pd.DataFrame({
+        "bet": labels, "legs": legs, "odds": bets["odds"], "P_model": bets["prob"], "EV": ev,
+        "kelly_single": fraction * np.clip(ev / np.maximum(bets["odds"] - 1, 1e-12), 0, None),
+        "kelly_simultaneous": f,
+    })
+    out["stake"] = (out["kelly_simultaneous"] * bankroll).round(0)
+    return out.sort_values("stake", ascending=False, ignore_index=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="EV + simultaneous Kelly stakes for a matchday report")
+    ap.add_argument("--report", required=True, help="run_predictions_quick report (P_*, odds or P_*_market)")
+    ap.add_argument("--bankroll", type=float, required=True)
+    ap.add_argument("--output", required=True, help="Excel path for the stake table")
+    ap.add_argument("--fraction", type=float, default=0.25, help="fractional Kelly multiplier")
+    ap.add_argument("--max-legs", type=int, default=1, help="1 = singles only, 2+ adds combos")
+    ap.add_argument("--max-bet", type=float, default=0.05, help="max bankroll share per bet")
+    ap.add_argument("--game-cap", type=float, default=0.10, help="max bankroll share exposed per game")
+    ap.add_argument("--total-cap", type=float, default=0.30, help="max bankroll share staked in total")
+    ap.add_argument("--scenarios", type=int, default=4000, help="Monte-Carlo matchday scenarios")
+    args = ap.parse_args()
+
+    df = pd.read_excel(args.report)
+    t0 = time.perf_counter()
+    table = stake_table(df, args.bankroll, args.max_legs, fraction=args.fraction, max_bet=args.max_bet,
+                        per_game_cap=args.game_cap, total_cap=args.total_cap, n_scenarios=args.scenarios)
+    elapsed = time.perf_counter() - t0
+
+    out_path = pathlib.Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(out_path) as xl:
+        add_ev_columns(df, args.fraction).to_excel(xl, sheet_name="games", index=False)
+        table.to_excel(xl, sheet_name="stakes", index=False)
+    staked = table["stake"].sum()
+    print(f"{len(table)} candidate bets, {int((table['stake'] > 0).sum())} staked, "
+          f"total {staked:,.0f} ({staked / args.bankroll:.1%}) in {1e3 * elapsed:.0f} ms")
+    print(f"✅ Stakes saved → {out_path}")
+
+
+if __name__ == "__main__":
+    main()
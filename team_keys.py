@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+team_keys.py
+------------
+Canonical team registry + integer game keys shared by every merge in the
+pipeline.
+
+Team strings arrive in many shapes — FootyStats names ("Jeonnam Dragons"),
+3-letter prefixes from update_matches.make_today_game_id() ("GYE"), analyst
+codes in qual CSVs ("JEONNAM", "SUF").  team_aliases.csv maps all of them to
+one `team_id` per club (J / K association namespaces, so promoted and
+relegated clubs keep their id).  Game ids arrive as
+
+    20250802-GYE-BUS        (update_matches)
+    20250802-K2-GYE-BUS     (qual docs)
+    2025080201              (qual docs, date + running number)
+
+and are encoded once, at ingest, into
+
+    game_key = YYYYMMDD * 1_000_000 + home_id * 1_000 + away_id   (int64)
+
+so downstream merges are integer joins.  Ids that carry no team names are
+resolved by (date, team) against the fixture list.
+
+Qual CSVs hold one row per team; pivot_qual() turns them into one row per
+game_key (home_*_score / away_*_score / diff_*_score) so fixture frames join
+them 1:1.
+
+Usage:
+    python team_keys.py --qual-file qual_numeric.csv --fixtures k2_matches_20250802.xlsx
+"""
+
+import argparse, pathlib, re, sys, unicodedata
+
+import numpy as np, pandas as pd
+
+TEAM_ALIAS_FILE = pathlib.Path(__file__).resolve().parent / "team_aliases.csv"
+LEAGUE_ASSOC = {"J1": "J", "J2": "J", "J3": "J", "K1": "K", "K2": "K"}
+
+GAME_ID_RE = re.compile(r"^(?P<date>\d{8})(?:-(?P<league>[JK]\d))?-(?P<home>[^-]+)-(?P<away>[^-]+)$")
+
+
+def norm_alias(s) -> str:
+    """'Busan I'Park' → 'BUSANIPARK', 'Ryūkyū' → 'RYUKYU'."""
+    s = unicodedata.normalize("NFKD", str(s)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^0-9A-Z]", "", s.upper())
+
+
+def assoc_of(league) -> str:
+    return LEAGUE_ASSOC.get(str(league).upper(), str(league).upper()[:1])
+
+
+def game_key(date_int, home_id, away_id) -> np.ndarray:
+    """Vectorized (YYYYMMDD, home_id, away_id) → int64 key; -1 where any part is unknown."""
+    d = np.asarray(date_int, dtype=np.int64)
+    h = np.asarray(home_id, dtype=np.int64)
+    a = np.asarray(away_id, dtype=np.int64)
+    key = d * 1_000_000 + h * 1_000 + a
+    return np.where((d > 0) & (h > 0) & (a > 0), key, -1)
+
+
+def split_game_key(key) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    key = np.asarray(key, dtype=np.int64)
+    return key // 1_000_000, key // 1_000 % 1_000, key % 1_000
+
+
+class TeamRegistry:
+    """Hashed alias → team_id lookup, scoped per association (J / K).
+
+    make_today_game_id() codes are the first three letters of the team name,
+    so a 3-letter alias that another club of the same association also
+    produces (NAG = Nagasaki's code and Nagoya's prefix, SAG, CHE, SUW, …)
+    names no single club: it is kept out of the lookup and only listed in
+    `ambiguous`, from where candidates() offers every club it may stand for.
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        self.table = table.set_index("team_id", drop=False)
+        self._lookup: dict[tuple[str, str], int] = {}
+        names: dict[tuple[str, str], set[int]] = {}
+        for r in table.itertuples(index=False):
+            aliases = [r.team_code, r.team_name, *str(r.aliases or "").split("|")]
+            for a in filter(None, map(norm_alias, aliases)):
+                prev = self._lookup.setdefault((r.assoc, a), r.team_id)
+                if prev != r.team_id:
+                    raise ValueError(f"alias {a!r} maps to team_id {prev} and {r.team_id} in {r.assoc}")
+                names.setdefault((r.assoc, a), set()).add(r.team_id)
+                if len(a) > 3:  # full names / long codes → the prefix make_today_game_id() gives them
+                    names.setdefault((r.assoc, a[:3]), set()).add(r.team_id)
+        self.ambiguous = {k: sorted(ids) for k, ids in names.items() if len(ids) > 1}
+        for k in self.ambiguous:
+            self._lookup.pop(k, None)
+
+    @classmethod
+    def load(cls, path=TEAM_ALIAS_FILE) -> "TeamRegistry":
+        return cls(pd.read_csv(path, dtype={"aliases": str}, keep_default_na=False))
+
+    def team_id(self, league, alias) -> int:
+        return self._lookup.get((assoc_of(league), norm_alias(alias)), -1)
+
+    def encode(self, league, aliases) -> np.ndarray:
+        """Vectorized alias → team_id (int32, -1 = unknown); `league` scalar or per-row."""
+        aliases = pd.Series(aliases).astype(str).reset_index(drop=True)
+        leagues = (pd.Series(league).astype(str).reset_index(drop=True)
+                   if np.ndim(league) else pd.Series(str(league), index=aliases.index))
+        keys = pd.MultiIndex.from_arrays([leagues.map(assoc_of), aliases])
+        uniq = keys.unique()  # one dict hit per distinct (assoc, alias)
+        ids = np.fromiter((self._lookup.get((a, norm_alias(s)), -1) for a, s in uniq),
+                          dtype=np.int32, count=len(uniq))
+        return ids[uniq.get_indexer(keys)]
+
+    def codes(self, team_ids) -> np.ndarray:
+        return self.table["team_code"].reindex(np.asarray(team_ids)).to_numpy()
+
+    def candidates(self, aliases) -> pd.DataFrame:
+        """alias → every team_id it may name in any association (for league-less / ambiguous ids)."""
+        wanted = set(map(norm_alias, pd.Series(aliases).dropna().unique()))
+        rows = [(a, tid) for (_, a), tid in self._lookup.items() if a in wanted]
+        rows += [(a, tid) for (_, a), ids in self.ambiguous.items() if a in wanted for tid in ids]
+        return pd.DataFrame(rows, columns=["alias_norm", "team_id"])
+
+
+def encode_fixtures(df: pd.DataFrame, league, registry: TeamRegistry | None = None) -> pd.DataFrame:
+    """Add home_id / away_id / game_key to a fixture frame (date, home_team, away_team)."""
+    registry = registry or TeamRegistry.load()
+    out = df.copy()
+    if "date" in out.columns:
+        date_int = pd.to_datetime(out["date"]).dt.strftime("%Y%m%d").astype(np.int64).to_numpy()
+    else:
+        date_int = out["today_game_id"].astype(str).str[:8].astype(np.int64).to_numpy()
+    lg = out["league"] if "league" in out.columns and league is None else league
+    out["home_id"] = registry.encode(lg, out["home_team"])
+    out["away_id"] = registry.encode(lg, out["away_team"])
+    out["game_key"] = game_key(date_int, out["home_id"], out["away_id"])
+    return out
+
+
+def _fixture_hits(date_int, aliases, lg, fixtures: pd.DataFrame, registry: TeamRegistry) -> pd.DataFrame:
+    """Every (row, team_id, game_key, side) where the row's alias names a club playing on its date."""
+    fx_key = fixtures["game_key"].to_numpy()
+    fx_date, fx_home, fx_away = split_game_key(fx_key)
+    sides = pd.DataFrame({"date_int": np.concatenate([fx_date, fx_date]),
+                          "team_id": np.concatenate([fx_home, fx_away]),
+                          "game_key": np.concatenate([fx_key, fx_key]),
+                          "side": np.repeat(["home", "away"], len(fx_key))})
+    sides = sides[sides["game_key"] > 0].drop_duplicates()
+
+    probe = pd.DataFrame({"row": np.arange(len(aliases)), "date_int": np.asarray(date_int),
+                          "alias_norm": pd.Series(aliases).map(norm_alias).to_numpy(),
+                          "assoc": pd.Series(lg).map(lambda x: assoc_of(x) if x else "").to_numpy()})
+    cand = registry.candidates(probe["alias_norm"])
+    cand["assoc"] = registry.table["assoc"].reindex(cand["team_id"]).to_numpy()
+    hit = probe.merge(cand, on="alias_norm").query("assoc_x == '' or assoc_x == assoc_y")
+    return hit.merge(sides, on=["date_int", "team_id"])[["row", "alias_norm", "team_id", "game_key", "side"]]
+
+
+def _unique_per_row(hit: pd.DataFrame, n: int, cols: list[str], warn: bool = True) -> pd.DataFrame:
+    """Rows with exactly one distinct hit; rows with several are reported and left unresolved (-1)."""
+    hit = hit.drop_duplicates(["row", *cols])
+    dup = hit["row"].duplicated(keep=False)
+    if dup.any() and warn:
+        sys.stderr.write(f"[경고] 모호한 팀 코드 {sorted(hit.loc[dup, 'alias_norm'].unique())} "
+                         f"→ {hit.loc[dup, 'row'].nunique()}행 미매칭\n")
+    hit = hit[~dup].set_index("row")
+    return pd.DataFrame({c: hit[c].reindex(np.arange(n)).fillna(-1).astype(np.int64).to_numpy() for c in cols})
+
+
+def encode_qual(qual: pd.DataFrame, fixtures: pd.DataFrame | None = None, league=None,
+                registry: TeamRegistry | None = None) -> pd.DataFrame:
+    """Add team_id / game_key to per-team qual rows (today_game_id, team_code).
+
+    With `fixtures` (frame with game_key / home_id / away_id) every row is
+    resolved by (date, team) — this is the only way for '2025080201'-style ids
+    and for league-less ids whose 3-letter codes exist in both J and K.  An
+    ambiguous code (NAG: Nagoya / Nagasaki) is settled by its opponent: by the
+    fixture the id's team tokens name, or — for ids without tokens — by the
+    game its partner row (same today_game_id, other team) resolved to.  A row
+    that still matches several fixtures is left at -1, never guessed.
+    Without fixtures the key is built from the team codes inside the id.
+    """
+    registry = registry or TeamRegistry.load()
+    out = qual.copy()
+    gid = out["today_game_id"].astype(str).str.strip()
+    parts = gid.str.extract(GAME_ID_RE)
+    date_int = gid.str[:8].where(gid.str[:8].str.isdigit(), "0").astype(np.int64)
+    lg = parts["league"].fillna(league if league is not None else "")
+
+    if fixtures is None:
+        out["team_id"] = registry.encode(lg, out["team_code"])
+        home = registry.encode(lg, parts["home"].fillna(""))
+        away = registry.encode(lg, parts["away"].fillna(""))
+        out["game_key"] = game_key(date_int, home, away)
+        return out
+
+    hit = _fixture_hits(date_int.to_numpy(), out["team_code"], lg, fixtures, registry)
+    id_key = encode_game_ids(gid, fixtures, league, registry, warn=False)
+    hit = hit[(id_key[hit["row"]] <= 0) | (hit["game_key"].to_numpy() == id_key[hit["row"]])]
+    hit = hit.drop_duplicates(["row", "team_id", "game_key"]).assign(gid=gid.to_numpy()[hit["row"]])
+
+    # rows left with several fixtures: keep the one a partner row of the same id settled on
+    amb = hit["row"].duplicated(keep=False)
+    partner = hit.loc[~amb, ["gid", "game_key", "team_id"]].rename(columns={"team_id": "partner_id"})
+    settled = hit[amb].merge(partner, on=["gid", "game_key"]).query("team_id != partner_id")
+    hit = pd.concat([hit[~amb], settled[hit.columns]], ignore_index=True)
+    res = _unique_per_row(hit, len(out), ["team_id", "game_key"])
+    out["team_id"] = res["team_id"].astype(np.int32).to_numpy()
+    out["game_key"] = res["game_key"].to_numpy()
+    return out
+
+
+def pivot_qual(qual: pd.DataFrame) -> pd.DataFrame:
+    """Encoded per-team qual rows → one row per game_key (index), home/away/diff score columns.
+
+    The side of each row comes from the game_key itself (home_id / away_id are
+    packed into it); rows whose team is in neither slot are dropped.
+    """
+    score_cols = [c for c in qual.columns if c.endswith("_score")]
+    q = qual[qual["game_key"] > 0].drop_duplicates(["game_key", "team_id"], keep="last")
+    _, home, away = split_game_key(q["game_key"].to_numpy())
+    team = q["team_id"].to_numpy()
+    scores = q[score_cols].apply(pd.to_numeric, errors="coerce").set_axis(q["game_key"].to_numpy())
+
+    h = scores[team == home].add_prefix("home_")
+    a = scores[team == away].add_prefix("away_")
+    wide = h.join(a, how="outer").rename_axis("game_key").sort_index()
+    for c in score_cols:
+        wide[f"diff_{c}"] = wide[f"home_{c}"] - wide[f"away_{c}"]
+    return wide
+
+
+def encode_game_ids(ids, fixtures: pd.DataFrame | None = None, league=None,
+                    registry: TeamRegistry | None = None, warn: bool = True) -> np.ndarray:
+    """game_key for per-game string ids (e.g. odds rows) via their team tokens.
+
+    With `fixtures` the home token must name the home side and the away token
+    the away side of one and the same fixture on that date, so a prefix shared
+    by two clubs playing the same matchday (SUW: Suwon FC / Bluewings) is
+    settled by the opponent; ids that still fit several fixtures stay -1.
+    """
+    ids = pd.Series(ids).astype(str).str.strip().reset_index(drop=True)
+    parts = ids.str.extract(GAME_ID_RE)
+    date_int = ids.str[:8].where(ids.str[:8].str.isdigit(), "0").astype(np.int64).to_numpy()
+    lg = parts["league"].fillna(league if league is not None else "")
+    registry = registry or TeamRegistry.load()
+
+    if fixtures is None:
+        home = registry.encode(lg, parts["home"].fillna(""))
+        away = registry.encode(lg, parts["away"].fillna(""))
+        return game_key(date_int, home, away)
+
+    home = _fixture_hits(date_int, parts["home"].fillna(""), lg, fixtures, registry).query("side == 'home'")
+    away = _fixture_hits(date_int, parts["away"].fillna(""), lg, fixtures, registry).query("side == 'away'")
+    both = home.merge(away[["row", "game_key"]], on=["row", "game_key"])
+    return _unique_per_row(both, len(ids), ["game_key"], warn)["game_key"].to_numpy()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Resolve qual CSV ids/team codes to integer keys")
+    ap.add_argument("--qual-file", required=True, help="qual_numeric CSV")
+    ap.add_argument("--fixtures", default="", help="feature/prediction xlsx with date, home_team, away_team")
+    ap.add_argument("--league", default=None, help="league of the fixtures file (e.g. K2)")
+    args = ap.parse_args()
+
+    reg = TeamRegistry.load()
+    qual = pd.read_csv(args.qual_file)
+    fixtures = None
+    if args.fixtures:
+        fx = pd.read_excel(args.fixtures)
+        fixtures = encode_fixtures(fx, args.league, reg)
+    out = encode_qual(qual, fixtures, registry=reg)
+    bad = out["game_key"] < 0
+    print(out.to_string(index=False))
+    print(f"{(~bad).sum()}/{len(out)} rows resolved to game_key")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,29 @@
 train_models.py
 ----------------
 * Train LightGBM multiclass models for multiple leagues
+* --engine poisson|ensemble: Dixon-Coles goals model (poisson_model.py) instead of /
+  blended with LightGBM; adds expected goals + most likely exact score columns
 * Save model pickles + calibrated prediction XLSX per league
+* --pooled: one LightGBM over the union of leagues with `league` as a categorical
+  feature (lgbm_pooled.pkl), optional --fine-tune rounds per league, one batched
+  predict_proba for the whole matchday; --compare reports hold-out accuracy /
+  log-loss and train / inference time against the per-league models
+* --export-numpy: also write each LightGBM model as flat .npy arrays
+  (<league>_lgbm_np/, lgbm_pooled_np/) for the numpy-only runtime in lgbm_numpy.py
+* --explain: refresh <league>_feature_weights_<date>.xlsx from the new model's
+  pred_contrib (explain_models.py)
 * Minimal feature engineering: use numeric columns (prefix 'feat_') + qualitative cols (qual_*)
 Assumes feature files <league>_matches_YYYYMMDD.xlsx exist under /mnt/data
 Label column: 'result' (0=H,1=D,2=A)
 """
 
-import argparse, pathlib, datetime as dt, pandas as pd, numpy as np, joblib, glob, re, os, lightgbm as lgb
+import argparse, pathlib, datetime as dt, pandas as pd, numpy as np, glob, re, os, time
 
-def latest_feature_file(league: str) -> pathlib.Path:
-    files = sorted(glob.glob(f"/mnt/data/{league.lower()}_matches_*.xlsx"))
+# final scores of the match itself — end in '_score' but are the label, not a feature
+LEAK_COLS = {"home_score", "away_score"}
+
+def latest_feature_file(league: str, data_dir: str = "/mnt/data") -> pathlib.Path:
+    files = sorted(glob.glob(f"{data_dir}/{league.lower()}_matches_*.xlsx"))
     if not files:
         raise FileNotFoundError(f"No feature files for {league}")
     return pathlib.Path(files[-1])
@@ -21,47 +34,204 @@ def latest_feature_file(league: str) -> pathlib.Path:
 def prepare_data(df: pd.DataFrame):
     # select numeric cols
     feature_cols = [c for c in df.columns if c.startswith("feat_") or c.startswith("qual_") or c.endswith("_score") or c in ["rest_days","travel_km"]]
+    feature_cols = [c for c in feature_cols if c not in LEAK_COLS]
     X = df[feature_cols].fillna(0)
     y = df["result"]
     return X, y, feature_cols
 
-def train_lgbm(X, y):
-    params = dict(objective="multiclass", num_class=3, learning_rate=0.05, n_estimators=300,
-                  max_depth=-1, subsample=0.8, colsample_bytree=0.8)
-    model = lgb.LGBMClassifier(**params)
-    model.fit(X, y)
+LGBM_PARAMS = dict(objective="multiclass", num_class=3, learning_rate=0.05, n_estimators=300,
+                   max_depth=-1, subsample=0.8, colsample_bytree=0.8)
+
+def train_lgbm(X, y, init_model=None, **overrides):
+    """Fit LGBM_PARAMS (+ overrides); `init_model` continues boosting from an earlier model."""
+    import lightgbm as lgb  # deferred: only training needs it
+    model = lgb.LGBMClassifier(**{**LGBM_PARAMS, **overrides})
+    model.fit(X, y, init_model=init_model)
     return model
 
+def pooled_frame(frames: dict) -> tuple[pd.DataFrame, list[str]]:
+    """Stack per-league feature frames; union of feature columns + categorical `league`."""
+    leagues = sorted(frames)
+    df = pd.concat([f.assign(league=lg) for lg, f in frames.items()], ignore_index=True)
+    # fixed category set so fine-tuning / inference see the same league codes
+    df["league"] = pd.Categorical(df["league"], categories=leagues)
+    _, _, feat_cols = prepare_data(df)
+    return df, feat_cols + ["league"]
+
+def pooled_matrix(df: pd.DataFrame, feat_cols: list[str], leagues: list[str]) -> pd.DataFrame:
+    X = df.reindex(columns=feat_cols[:-1]).fillna(0)
+    X["league"] = pd.Categorical(df["league"].astype(str), categories=leagues)
+    return X
+
+def predict_pooled(bundle: dict, df: pd.DataFrame) -> np.ndarray:
+    """P_H/P_D/P_A for a mixed-league frame in one call (fine-tuned boosters per league if present)."""
+    X = pooled_matrix(df, bundle["features"], bundle["leagues"])
+    P = bundle["model"].predict_proba(X)
+    for lg, ft in bundle.get("fine_tuned", {}).items():
+        m = (df["league"].astype(str) == lg).to_numpy()
+        if m.any():
+            P[m] = ft.predict_proba(X[m])
+    return P
+
+def train_pooled(df_train: pd.DataFrame, feat_cols: list[str], leagues: list[str]) -> dict:
+    model = train_lgbm(pooled_matrix(df_train, feat_cols, leagues), df_train["result"])
+    return {"model": model, "features": feat_cols, "leagues": leagues, "fine_tuned": {}}
+
+def fine_tune_pooled(bundle: dict, df_train: pd.DataFrame, rounds: int) -> dict:
+    """Continue the pooled booster for `rounds` trees on each league's own rows."""
+    X = pooled_matrix(df_train, bundle["features"], bundle["leagues"])
+    y = df_train["result"]
+    tuned = {}
+    for lg in bundle["leagues"]:
+        m = (df_train["league"].astype(str) == lg).to_numpy()
+        if y[m].nunique() == 3:
+            tuned[lg] = train_lgbm(X[m], y[m], init_model=bundle["model"].booster_, n_estimators=rounds)
+    return {**bundle, "fine_tuned": tuned}
+
+def _scores(P: np.ndarray, y: np.ndarray) -> dict:
+    P = np.clip(P, 1e-15, 1.0)
+    return {"accuracy": float((P.argmax(axis=1) == y).mean()),
+            "log_loss": float(-np.log(P[np.arange(len(y)), y]).mean())}
+
+def compare_pooled(df_train: pd.DataFrame, feat_cols: list[str], leagues: list[str],
+                   fine_tune: int = 0, holdout: float = 0.2) -> pd.DataFrame:
+    """Time-ordered hold-out (last `holdout` share per league): per-league vs pooled."""
+    df_train = df_train.sort_values("date", kind="stable")
+    rank = df_train.groupby("league", observed=True)["date"].rank(method="first", pct=True)
+    fit, test = df_train[rank <= 1 - holdout], df_train[rank > 1 - holdout]
+    y_test = test["result"].to_numpy(dtype=int)
+
+    t0 = time.perf_counter()
+    per_league = {}
+    for lg, g in fit.groupby("league", observed=True):
+        X, y, cols = prepare_data(g)
+        per_league[lg] = (train_lgbm(X, y), cols)
+    t_train_sep = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    P_sep = np.zeros((len(test), 3))
+    for lg, (model, cols) in per_league.items():
+        m = (test["league"].astype(str) == lg).to_numpy()
+        P_sep[m] = model.predict_proba(test.loc[m, cols].fillna(0))
+    t_inf_sep = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    bundle = train_pooled(fit, feat_cols, leagues)
+    t_train_pool = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    P_pool = predict_pooled(bundle, test)
+    t_inf_pool = time.perf_counter() - t0
+
+    setups = [("per_league", P_sep, t_train_sep, t_inf_sep), ("pooled", P_pool, t_train_pool, t_inf_pool)]
+    if fine_tune > 0:
+        t0 = time.perf_counter()
+        bundle = fine_tune_pooled(bundle, fit, fine_tune)
+        t_train_ft = t_train_pool + time.perf_counter() - t0
+        t0 = time.perf_counter()
+        P_ft = predict_pooled(bundle, test)
+        setups.append(("pooled_fine_tuned", P_ft, t_train_ft, time.perf_counter() - t0))
+
+    rows = []
+    for name, P, t_train, t_inf in setups:
+        for lg in leagues:
+            m = (test["league"].astype(str) == lg).to_numpy()
+            if m.any():
+                rows.append({"setup": name, "league": lg, "games": int(m.sum()), **_scores(P[m], y_test[m])})
+        rows.append({"setup": name, "league": "ALL", "games": len(test), **_scores(P, y_test),
+                     "train_s": round(t_train, 3), "infer_ms": round(1e3 * t_inf, 2)})
+    return pd.DataFrame(rows)
+
 def main():
+    import joblib
+
     ap = argparse.ArgumentParser()
     ap.add_argument("--date", required=True, help="YYYY-MM-DD (matches before this date used for training)")
     ap.add_argument("--leagues", nargs="+", required=True, help="e.g. J2 K1 K2")
+    ap.add_argument("--data-dir", default="/mnt/data", help="where <league>_matches_*.xlsx live")
     ap.add_argument("--model-dir", default="/mnt/data/models")
     ap.add_argument("--output-dir", default="/mnt/data")
+    ap.add_argument("--engine", choices=["lgbm", "poisson", "ensemble"], default="lgbm")
+    ap.add_argument("--lgbm-weight", type=float, default=0.5, help="LightGBM share of the ensemble blend")
+    ap.add_argument("--xi", type=float, default=0.0, help="Dixon-Coles time decay per day")
+    ap.add_argument("--pooled", action="store_true", help="one LightGBM for all leagues (league = categorical feature)")
+    ap.add_argument("--fine-tune", type=int, default=0, help="extra boosting rounds per league on top of the pooled model")
+    ap.add_argument("--compare", action="store_true", help="with --pooled: hold-out comparison vs per-league models")
+    ap.add_argument("--export-numpy", action="store_true", help="also export LightGBM models for lgbm_numpy.py")
+    ap.add_argument("--explain", action="store_true", help="write pred_contrib feature weights per league")
+    ap.add_argument("--explain-cache", default="/mnt/data/explain_cache", help="contribution cache for --explain")
     args = ap.parse_args()
 
     train_cutoff = dt.datetime.strptime(args.date, "%Y-%m-%d").date()
     pathlib.Path(args.model_dir).mkdir(parents=True, exist_ok=True)
 
+    frames = {lg: pd.read_excel(latest_feature_file(lg, args.data_dir)) for lg in args.leagues}
+    pooled_preds = {}
+    if args.pooled and args.engine in ("lgbm", "ensemble"):
+        df_all, feat_cols = pooled_frame(frames)
+        df_train = df_all[df_all["date"].dt.date < train_cutoff]
+        if "result" not in df_train.columns:
+            raise ValueError("feature files must contain 'result' column")
+        df_train = df_train.dropna(subset=["result"])  # postponed / unplayed fixtures
+        leagues = list(df_all["league"].cat.categories)
+        if args.compare:
+            report = compare_pooled(df_train, feat_cols, leagues, args.fine_tune)
+            print(report.to_string(index=False))
+            report.to_excel(f"{args.output_dir}/pooled_comparison.xlsx", index=False)
+        bundle = train_pooled(df_train, feat_cols, leagues)
+        if args.fine_tune > 0:
+            bundle = fine_tune_pooled(bundle, df_train, args.fine_tune)
+        joblib.dump(bundle, f"{args.model_dir}/lgbm_pooled.pkl")
+        if args.export_numpy:
+            from lgbm_numpy import export_model
+            export_model(bundle["model"], f"{args.model_dir}/lgbm_pooled_np", feat_cols)
+            for lg, ft in bundle["fine_tuned"].items():
+                export_model(ft, f"{args.model_dir}/{lg.lower()}_lgbm_pooled_ft_np", feat_cols)
+        # one batched call for every league's rows
+        P = predict_pooled(bundle, df_all)
+        lg_col = df_all["league"].astype(str).to_numpy()
+        pooled_preds = {lg: P[lg_col == lg] for lg in leagues}
+        print(f"[pooled] {len(df_train)} training rows, {len(leagues)} leagues → lgbm_pooled.pkl")
+
     for lg in args.leagues:
-        feat_path = latest_feature_file(lg)
-        df = pd.read_excel(feat_path)
+        feat_path = latest_feature_file(lg, args.data_dir)
+        df = frames[lg]
 
         df_train = df[df["date"].dt.date < train_cutoff]
         if "result" not in df_train.columns:
             raise ValueError(f"{feat_path} must contain 'result' column")
+        df_train = df_train.dropna(subset=["result"])  # postponed / unplayed fixtures
 
-        X, y, feat_cols = prepare_data(df_train)
-        model = train_lgbm(X, y)
-        joblib.dump({"model": model, "features": feat_cols}, f"{args.model_dir}/{lg.lower()}_lgbm.pkl")
-
-        # Generate calibrated preds for all rows (including pre‑match for reference)
-        preds = model.predict_proba(df[feat_cols].fillna(0))
         df_out = df[["today_game_id","home_team","away_team"]].copy()
+        preds = pooled_preds.get(lg)
+        if args.engine in ("lgbm", "ensemble") and preds is None:
+            X, y, feat_cols = prepare_data(df_train)
+            model = train_lgbm(X, y)
+            joblib.dump({"model": model, "features": feat_cols}, f"{args.model_dir}/{lg.lower()}_lgbm.pkl")
+            if args.export_numpy:
+                from lgbm_numpy import export_model
+                export_model(model, f"{args.model_dir}/{lg.lower()}_lgbm_np", feat_cols)
+            # Generate calibrated preds for all rows (including pre‑match for reference)
+            preds = model.predict_proba(df[feat_cols].fillna(0))
+
+        if args.engine in ("poisson", "ensemble"):
+            from poisson_model import fit_dixon_coles, outcome_probs, top_scores
+            dc = fit_dixon_coles(df_train, xi=args.xi)
+            joblib.dump(dc, f"{args.model_dir}/{lg.lower()}_poisson.pkl")
+            M = dc.score_matrix(df["home_team"], df["away_team"])
+            p_dc = outcome_probs(M)
+            preds = p_dc if preds is None else args.lgbm_weight * preds + (1 - args.lgbm_weight) * p_dc
+            df_out["exp_home_goals"], df_out["exp_away_goals"] = dc.expected_goals(df["home_team"], df["away_team"])
+            df_out["top_score"], df_out["P_top_score"] = top_scores(M)
+
         df_out[["P_H","P_D","P_A"]] = preds
         df_out.to_excel(f"{args.output_dir}/{lg.lower()}_predictions_calibrated.xlsx", index=False)
 
         print(f"[{lg}] model saved & predictions exported")
 
+    if args.explain and args.engine in ("lgbm", "ensemble"):
+        from explain_models import explain_league
+        for lg in args.leagues:
+            explain_league(lg, args.date, args.model_dir, args.data_dir, args.explain_cache, args.output_dir,
+                           pooled=args.pooled)
+
 if __name__ == "__main__":
     main()
@@ -9,22 +9,49 @@ Basic steps
 -----------
 1. Download fixtures + results for the given league from FootyStats API
    (requires env FOOTYSTATS_KEY or --api-key).
-2. Engineer essential numeric features (date, home/away team, result, etc.).
-3. Merge qualitative CSV (score columns) if provided.
-4. Optionally merge with an existing feature file (keeps unique today_game_id).
-5. Save as <league>_matches_YYYYMMDD.xlsx under --output-dir.
+2. Normalize the JSON column-wise (normalize_matches): date, home/away team,
+   result, today_game_id, team_code via vectorized ops.  Only fields known
+   before kick-off become features (feat_<name>): pre_match_*, odds_*,
+   *_prematch, *_potential, plus the original home_xg / away_xg stubs.
+   Everything else FootyStats returns (goals, winningTeam, HT scores, shots,
+   possession, match xG, …) describes the finished match — it would leak the
+   result into training and is -1 / 0 for unplayed fixtures — so it is
+   dropped (an allowlist, so new post-match fields stay out by default).
+   Fixtures that are not `status == "complete"` (or report -1 goals) get
+   NaN home_score / away_score / result, so training and backtests skip them.
+3. Encode integer keys (team_keys.py): home_id / away_id / game_key.
+4. Merge qualitative CSV (score columns) if provided — pivoted to one row per
+   game (home_/away_/diff_*_score) and joined 1:1 on game_key, whatever id
+   format the CSV uses.
+5. Optionally merge with an existing feature file (keeps unique game_key).
+6. Save as <league>_matches_YYYYMMDD.xlsx under --output-dir.
 
 NOTE:
 • This is a minimal working example; extend feature engineering as needed.
 • FootyStats free tier limits requests — consider local caching if rate‑limited.
 """
 
-import argparse, datetime as dt, os, pathlib, requests, pandas as pd, sys, json
+import argparse, datetime as dt, os, pathlib, re, requests, pandas as pd, numpy as np, sys, json
+
+try:  # optional, ~3x faster decode of large multi-season responses
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from team_keys import TeamRegistry, encode_fixtures, encode_qual, norm_alias, pivot_qual
 
 API_BASE = "https://api.footystats.org/league-matches"
 
-def fetch_matches(league_id: int, from_date: str, to_date: str, api_key: str) -> list[dict]:
-    """Call FootyStats API and return list of match dicts."""
+# numeric FootyStats fields known before kick-off; everything else is an id or post-match
+PRE_MATCH_RE = re.compile(r"^(pre_match_|odds_)|(_prematch|_potential)$")
+LEGACY_FEATURES = ["home_xg", "away_xg"]  # stub features of the original per-match loop
+
+def pre_match_field(name: str) -> bool:
+    return name in LEGACY_FEATURES or PRE_MATCH_RE.search(name) is not None
+
+def fetch_matches_raw(league_id: int, from_date: str, to_date: str, api_key: str) -> bytes:
+    """Call FootyStats API and return the undecoded response body."""
     params = {
         "key": api_key,
         "league_id": league_id,
@@ -34,14 +61,65 @@ def fetch_matches(league_id: int, from_date: str, to_date: str, api_key: str) ->
     print(f"[FootyStats] GET {API_BASE} for {from_date}‑{to_date}")
     r = requests.get(API_BASE, params=params, timeout=60)
     r.raise_for_status()
-    return r.json().get("data", [])
+    return r.content
+
+def fetch_matches(league_id: int, from_date: str, to_date: str, api_key: str) -> list[dict]:
+    """Call FootyStats API and return list of match dicts."""
+    return _json_loads(fetch_matches_raw(league_id, from_date, to_date, api_key)).get("data", [])
 
 def make_today_game_id(row) -> str:
     date_part = row["date"].strftime("%Y%m%d")
-    home_code = row["home_team"][:3].upper()
-    away_code = row["away_team"][:3].upper()
+    # same normalization as the registry: 'Ryūkyū' → 'RYU', 'V-Varen Nagasaki' → 'VVA'
+    home_code = norm_alias(row["home_team"])[:3]
+    away_code = norm_alias(row["away_team"])[:3]
     return f"{date_part}-{home_code}-{away_code}"
 
+def make_today_game_ids(df: pd.DataFrame) -> pd.Series:
+    """Vectorized make_today_game_id() over a whole frame."""
+    def code(s: pd.Series) -> pd.Series:
+        return s.map(norm_alias).str[:3]
+    return df["date"].dt.strftime("%Y%m%d") + "-" + code(df["home_team"]) + "-" + code(df["away_team"])
+
+def normalize_matches(payload) -> pd.DataFrame:
+    """FootyStats response (bytes/str or list of match dicts) → feature frame, column-wise."""
+    data = _json_loads(payload).get("data", []) if isinstance(payload, (bytes, str)) else payload
+    raw = pd.DataFrame(data)
+    if raw.empty:
+        return raw
+    hg = pd.to_numeric(raw["homeGoalCount"], errors="coerce")
+    ag = pd.to_numeric(raw["awayGoalCount"], errors="coerce")
+    # unplayed / postponed fixtures come back with -1 goals → no score, no result (not a 0-0 draw)
+    played = (hg >= 0) & (ag >= 0)
+    if "status" in raw.columns:
+        played &= raw["status"].eq("complete")
+    hg, ag = hg.where(played), ag.where(played)
+    # match_date is local kick-off day; date_unix (UTC) only as fallback
+    date = (pd.to_datetime(raw["match_date"]) if "match_date" in raw.columns
+            else pd.to_datetime(raw["date_unix"], unit="s"))
+
+    df = pd.DataFrame({
+        "date": date,
+        "home_team": raw["home_name"].astype(str),
+        "away_team": raw["away_name"].astype(str),
+        "home_score": hg,
+        "away_score": ag,
+        # 0=H, 1=D, 2=A
+        "result": 1 - np.sign(hg - ag),
+    })
+    df["today_game_id"] = make_today_game_ids(df)
+    df["team_code"] = df["home_team"].map(norm_alias).str[:3]  # for merge with qual
+
+    stats = raw.select_dtypes("number")
+    stats = stats[[c for c in stats.columns if pre_match_field(c)]]
+    stats = stats.reindex(columns=stats.columns.union(LEGACY_FEATURES, sort=False))
+    return pd.concat([df, stats.add_prefix("feat_")], axis=1)
+
+def warn_unknown_teams(df: pd.DataFrame):
+    """Unregistered names would silently drop out of every integer join."""
+    unknown = sorted(set(df.loc[df["home_id"] < 0, "home_team"]) | set(df.loc[df["away_id"] < 0, "away_team"]))
+    if unknown:
+        print(f"⚠️  team_aliases.csv 에 없는 팀: {unknown}", file=sys.stderr)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--league", required=True, help="League code e.g. J2")
@@ -59,39 +137,29 @@ def main():
     from_date = (today - dt.timedelta(days=365)).strftime("%Y-%m-%d")  # 1y history
     to_date = today.strftime("%Y-%m-%d")
 
-    # Fetch raw JSON
-    matches = fetch_matches(args.league_id, from_date, to_date, args.api_key)
-    if not matches:
+    # Fetch raw JSON → DataFrame (column-wise)
+    df = normalize_matches(fetch_matches_raw(args.league_id, from_date, to_date, args.api_key))
+    if df.empty:
         sys.exit("No matches returned from API; check league_id/date range")
 
-    # Basic → DataFrame
-    records = []
-    for m in matches:
-        rec = {
-            "date": pd.to_datetime(m["match_date"]),
-            "home_team": m["home_name"],
-            "away_team": m["away_name"],
-            "home_score": m["homeGoalCount"],
-            "away_score": m["awayGoalCount"],
-            "result": 0 if m["homeGoalCount"] > m["awayGoalCount"] else 2 if m["homeGoalCount"] < m["awayGoalCount"] else 1,
-            # stub feature examples
-            "feat_home_xg": m.get("home_xg", None),
-            "feat_away_xg": m.get("away_xg", None),
-        }
-        records.append(rec)
-    df = pd.DataFrame(records)
-    df["today_game_id"] = df.apply(make_today_game_id, axis=1)
-    df["team_code"] = df["home_team"].str[:3].str.upper()  # for merge with qual
+    # Integer keys, once, at ingest
+    registry = TeamRegistry.load()
+    df = encode_fixtures(df, args.league, registry)
+    warn_unknown_teams(df)
 
     # Merge qualitative scores
     if args.merge_qual and pathlib.Path(args.merge_qual).exists():
-        qual = pd.read_csv(args.merge_qual)
-        df = df.merge(qual, on=["today_game_id", "team_code"], how="left")
+        qual = pivot_qual(encode_qual(pd.read_csv(args.merge_qual), df, args.league, registry))
+        df = df.merge(qual, left_on="game_key", right_index=True, how="left", validate="many_to_one")
 
     # Merge existing (keep newest)
     if args.merge_existing and pathlib.Path(args.merge_existing).exists():
         old = pd.read_excel(args.merge_existing)
-        df = pd.concat([old, df], ignore_index=True).drop_duplicates("today_game_id", keep="last")
+        # files written before the pre-match allowlist may still carry post-match feat_ columns
+        old = old.drop(columns=[c for c in old.columns if c.startswith("feat_") and not pre_match_field(c[5:])])
+        df = encode_fixtures(pd.concat([old, df], ignore_index=True), args.league, registry)
+        dedup = df["game_key"].astype(str).where(df["game_key"] > 0, df["today_game_id"])
+        df = df[~dedup.duplicated(keep="last")]
 
     # Save
     out_path = pathlib.Path(args.output_dir) / f"{args.league.lower()}_matches_{today.strftime('%Y%m%d')}.xlsx"
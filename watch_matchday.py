@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+watch_matchday.py
+-----------------
+Matchday watch mode: keeps the run_predictions_quick report current while
+qualitative DOCX reports and odds files keep landing.
+
+* Polls the qual-docs folder and the odds CSV(s) (mtime + size, no extra
+  dependency); a burst of saves is debounced into one update once the inputs
+  have been quiet for --debounce seconds
+* Only changed DOCX files are re-parsed and only changed odds rows are
+  compared; the resulting set of game_keys is the unit of work
+* For those games only: qual merge → ΔP vs market → EV / Kelly columns →
+  upset flag, the same steps as run_predictions_quick.  Cover picks are
+  re-ranked over the whole day (a sort of the entropy column — entropy
+  itself is kept per game)
+* Writes the qual CSV and the Excel report after every update, logging the
+  today_game_ids that changed; with --bankroll the 'stakes' sheet is
+  re-solved over the whole day on every write (simultaneous Kelly is joint)
+
+Usage:
+    python watch_matchday.py --date 2025-08-02 --qual-dir /mnt/data/qual_docs \
+        --odds-file /mnt/data/odds_20250802.csv --output /mnt/data/report_20250802.xlsx
+"""
+
+import argparse, datetime as dt, pathlib, sys, time
+
+import pandas as pd
+
+from team_keys import TeamRegistry, encode_qual, encode_game_ids
+from run_predictions_quick import load_matchday, attach_qual, attach_odds
+from soccer_agent_pipeline import flag_upsets
+from staking import add_ev_columns, stake_table
+
+
+def snapshot(paths) -> dict[pathlib.Path, tuple[int, int]]:
+    snap = {}
+    for p in paths:
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        snap[p] = (st.st_mtime_ns, st.st_size)
+    return snap
+
+
+class MatchdayWatcher:
+    def __init__(self, date: str, leagues, qual_dir: pathlib.Path, odds_files, output: pathlib.Path,
+                 qual_csv: pathlib.Path | None = None, recursive: bool = False, n_cover: int = 4,
+                 kelly_fraction: float = 0.25, bankroll: float = 0, max_legs: int = 1):
+        from qual_numeric_converter_updated import docx_records  # python-docx only needed here
+        self._docx_records = docx_records
+        self.qual_dir, self.recursive = qual_dir.resolve(), recursive
+        self.odds_files = [pathlib.Path(f).resolve() for f in odds_files]
+        self.output, self.qual_csv, self.n_cover = output, qual_csv, n_cover
+        self.kelly_fraction, self.bankroll, self.max_legs = kelly_fraction, bankroll, max_legs
+
+        self.registry = TeamRegistry.load()
+        base = load_matchday(date, leagues, self.registry)
+        unknown = base["game_key"] < 0
+        if unknown.any():
+            sys.stderr.write(f"[경고] team_aliases.csv 미등록 팀 경기 제외: {base.loc[unknown, 'today_game_id'].tolist()}\n")
+        self.base = base[~unknown].set_index("game_key", drop=False)
+        self.qual_by_file: dict[pathlib.Path, pd.DataFrame] = {}
+        self.odds_by_file: dict[pathlib.Path, pd.DataFrame] = {}
+        self.report = pd.DataFrame()
+        self.snap: dict[pathlib.Path, tuple[int, int]] = {}
+
+    # ------------------------------------------------------------ inputs
+    def watched_paths(self) -> list[pathlib.Path]:
+        pattern = "**/*.docx" if self.recursive else "*.docx"
+        docs = [p for p in self.qual_dir.glob(pattern) if not p.name.startswith("~$")]  # skip Word lock files
+        return docs + self.odds_files
+
+    def _load_qual(self, path: pathlib.Path) -> pd.DataFrame:
+        recs = self._docx_records(path) if path.exists() else []
+        if not recs:
+            return pd.DataFrame(columns=["game_key", "team_id"])
+        return encode_qual(pd.DataFrame(recs), self.base, registry=self.registry)
+
+    def _load_odds(self, path: pathlib.Path) -> pd.DataFrame:
+        if not path.exists():
+            return pd.DataFrame(columns=["game_key"])
+        odds = pd.read_csv(path)
+        if "game_key" not in odds.columns:
+            odds["game_key"] = encode_game_ids(odds["today_game_id"], self.base, registry=self.registry)
+        return odds.drop(columns=["today_game_id"], errors="ignore").drop_duplicates("game_key", keep="last")
+
+    def apply_changes(self, paths) -> set[int]:
+        """Reload changed inputs; return the game_keys whose inputs differ."""
+        affected: set[int] = set()
+        for p in paths:
+            if p in self.odds_files:
+                old = self.odds_by_file.get(p, pd.DataFrame(columns=["game_key"])).set_index("game_key")
+                new = self._load_odds(p)
+                self.odds_by_file[p] = new
+                new = new.set_index("game_key")
+                keys = old.index.union(new.index)
+                a = old.reindex(index=keys, columns=new.columns.union(old.columns))
+                b = new.reindex(index=keys, columns=a.columns)
+                diff = ~((a == b) | (a.isna() & b.isna())).all(axis=1)
+                affected |= set(keys[diff.to_numpy()])
+            else:
+                old = self.qual_by_file.pop(p, None)
+                if old is not None:
+                    affected |= set(old["game_key"])
+                new = self._load_qual(p)
+                if not new.empty:
+                    self.qual_by_file[p] = new
+                    affected |= set(new["game_key"])
+        return {k for k in affected if k in self.base.index}
+
+    # ---------------------------------------------------------- recompute
+    def recompute(self, keys: set[int]):
+        keys = sorted(keys)
+        rows = self.base.loc[keys].reset_index(drop=True)
+        qual = pd.concat(self.qual_by_file.values(), ignore_index=True) if self.qual_by_file else pd.DataFrame()
+        if not qual.empty:
+            qual = qual[qual["game_key"].isin(keys)].drop_duplicates(["game_key", "team_id"], keep="last")
+            rows = attach_qual(rows, qual, self.registry)
+        odds = pd.concat(self.odds_by_file.values(), ignore_index=True) if self.odds_by_file else pd.DataFrame()
+        if not odds.empty:
+            rows = attach_odds(rows, odds[odds["game_key"].isin(keys)], self.registry)
+        if self.odds_files:
+            rows = add_ev_columns(rows, self.kelly_fraction)
+        rows = flag_upsets(rows, n_cover=0).set_index("game_key", drop=False)
+
+        rest = self.report.drop(index=keys, errors="ignore")
+        report = pd.concat([rest, rows]) if not rest.empty else rows
+        report["cover_flag"] = report.index.isin(report["entropy"].nlargest(self.n_cover).index)
+        self.report = report.sort_values("entropy", ascending=False)
+
+    def write(self):
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        if self.bankroll > 0:
+            stakes = stake_table(self.report, self.bankroll, self.max_legs, fraction=self.kelly_fraction)
+            with pd.ExcelWriter(self.output) as xl:
+                self.report.to_excel(xl, sheet_name="report", index=False)
+                stakes.to_excel(xl, sheet_name="stakes", index=False)
+        else:
+            self.report.to_excel(self.output, index=False)
+        if self.qual_csv and self.qual_by_file:
+            qual = pd.concat(self.qual_by_file.values(), ignore_index=True)
+            qual.drop(columns=["game_key", "team_id"]).to_csv(self.qual_csv, index=False)
+
+    # ---------------------------------------------------------------- loop
+    def poll(self) -> set[pathlib.Path]:
+        new = snapshot(self.watched_paths())
+        changed = {p for p in new.keys() | self.snap.keys() if new.get(p) != self.snap.get(p)}
+        self.snap = new
+        return changed
+
+    def update(self, changed: set[pathlib.Path]):
+        t0 = time.perf_counter()
+        keys = self.apply_changes(changed)
+        if self.report.empty:
+            keys = set(self.base.index)  # first pass covers every game of the day
+        if not keys:
+            return
+        self.recompute(keys)
+        self.write()
+        ids = self.base.loc[sorted(keys), "today_game_id"].tolist()
+        print(f"[{dt.datetime.now():%H:%M:%S}] {len(changed)} file(s) → {len(ids)} game(s) "
+              f"recomputed in {1e3 * (time.perf_counter() - t0):.0f} ms: {ids}")
+
+    def run(self, interval: float, debounce: float, once: bool = False):
+        self.update(self.poll())
+        if once:
+            return
+        pending: set[pathlib.Path] = set()
+        last_event = 0.0
+        while True:
+            time.sleep(interval)
+            changed = self.poll()
+            if changed:
+                pending |= changed
+                last_event = time.monotonic()
+            elif pending and time.monotonic() - last_event >= debounce:
+                self.update(pending)
+                pending = set()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Watch qual DOCX + odds inputs and update the matchday report")
+    ap.add_argument("--date", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--leagues", nargs="+", default=["J2", "K1", "K2"])
+    ap.add_argument("--qual-dir", default="/mnt/data/qual_docs", help="folder of qualitative DOCX reports")
+    ap.add_argument("--recursive", action="store_true", help="watch sub-folders too")
+    ap.add_argument("--odds-file", nargs="*", default=[], help="market odds CSV(s) to watch")
+    ap.add_argument("--output", required=True, help="Excel report path (rewritten on every update)")
+    ap.add_argument("--qual-csv", default="", help="also keep this qual_numeric CSV up to date")
+    ap.add_argument("--kelly-fraction", type=float, default=0.25, help="fractional Kelly multiplier")
+    ap.add_argument("--bankroll", type=float, default=0, help="add a 'stakes' sheet sized for this bankroll")
+    ap.add_argument("--max-legs", type=int, default=1, help="combo size for the stakes sheet (1 = singles)")
+    ap.add_argument("--interval", type=float, default=1.0, help="poll interval (s)")
+    ap.add_argument("--debounce", type=float, default=2.0, help="quiet period before recomputing (s)")
+    ap.add_argument("--once", action="store_true", help="single pass, then exit")
+    args = ap.parse_args()
+
+    qual_dir = pathlib.Path(args.qual_dir)
+    if not qual_dir.exists():
+        sys.exit(f"ERROR: qual folder {qual_dir} not found")
+
+    watcher = MatchdayWatcher(args.date, args.leagues, qual_dir, args.odds_file, pathlib.Path(args.output),
+                              pathlib.Path(args.qual_csv) if args.qual_csv else None, args.recursive,
+                              kelly_fraction=args.kelly_fraction, bankroll=args.bankroll, max_legs=args.max_legs)
+    try:
+        watcher.run(args.interval, args.debounce, args.once)
+    except KeyboardInterrupt:
+        print("watch stopped")
+
+
+if __name__ == "__main__":
+    main()